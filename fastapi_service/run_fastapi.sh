@@ -2,4 +2,4 @@
 #uvicorn fastapiapp:app --host 0.0.0.0 --port 8000
 
 /home/ubuntu/miniconda3/condabin/conda activate ds-env
-/home/ubuntu/miniconda3/envs/ds-env/bin/uvicorn fastapiapp:app --host 0.0.0.0 --port 8000
\ No newline at end of file
+/home/ubuntu/miniconda3/envs/ds-env/bin/python -m prediction_app.prefork_server
\ No newline at end of file
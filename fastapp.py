@@ -1,27 +1,323 @@
 import os
-import yaml
-import pickle
-import mlflow.pyfunc
-import pandas as pd
+import json
+import time
+import asyncio
+import logging
+import threading
+import functools
+import numpy as np
 from typing import List
-from pydantic import BaseModel
-from fastapi import FastAPI, HTTPException
+from typing_extensions import TypedDict
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+
+from prediction_app.admission import AdmissionController, Overloaded, DeadlineExceeded, check_deadline
+from prediction_app.arrow_io import ARROW_STREAM, read_arrow_table, arrow_feature_columns, write_arrow_predictions
+from prediction_app.metrics import MetricsMiddleware, STAGE_LATENCY, PREDICTIONS, MODEL_INFO, render_metrics
+from prediction_app.micro_batcher import MicroBatcher
+from prediction_app.prediction_cache import PredictionCache
+from prediction_app.prediction_log import PredictionLogSink
+from prediction_app.prefork_server import process_memory
+from prediction_app.process_pool import ProcessPoolBackend
+from prediction_app.request_validator import SchemaValidator, SchemaViolation, VALIDATION_ERRORS
+from prediction_app.predictor_registry import PredictorRegistry
+from prediction_app.shadow import ShadowEvaluator
 
 # run >> uvicorn fastapp:app --host 0.0.0.0 --port 8000
 # http://localhost:8000/docs
 
-# app = FastAPI()
-app = FastAPI(template_directory="prediction_app/templates")
+# Config, scalers and model are loaded once per process and shared by all requests
+registry = PredictorRegistry('parameters.yaml')
+
+# Coalesces concurrent /predict calls and caches repeated quotes,
+# both created at startup when enabled in the config
+batcher = None
+prediction_cache = None
+
+# Bounds the /predict and /batch_predict requests doing model work at once
+admission = None
+
+# Records every served prediction to hourly parquet off the request path
+prediction_log = None
+
+# Scores a candidate model on the served batches off the request path; the candidate
+# is loaded with the model, its thread started by each serving process
+shadow = None
+
+# Scores large batches in worker processes, started by each serving process once the model is loaded
+process_pool = None
+
+# Checks requests against the training data schema (counted in `warn` mode, refused in `reject` mode)
+request_validator = None
+
+# The model is loaded and warmed up in the background so the server accepts
+# connections immediately; prediction routes return 503 until it is ready.
+# A failed load is retried, and a bundle published later is warmed up when it is swapped in
+warm_up_task = None
+warmed_up = False
+load_error = None
+warm_up_lock = threading.Lock()
+shutting_down = threading.Event()
+
+# True in processes that serve requests, as opposed to the prefork master
+serving_process = False
+
+WARMUP_RECORD = {
+    "trip_miles": 1.0, "trip_time": 2.0, "access_a_ride_flag": "Y",
+    "request_datetime_hour": 1, "request_datetime_day": "Monday", "request_datetime_month": "January",
+    "duration_minutes": 3.0, "wait_time_minutes": 4.0, "service_time_minutes": 5.0,
+    "on_scene_datetime_hour": 6, "on_scene_datetime_day": "Tuesday", "on_scene_datetime_month": "February",
+    "pickup_datetime_hour": 7, "pickup_datetime_day": "Wednesday", "pickup_datetime_month": "March",
+    "dropoff_datetime_hour": 8, "dropoff_datetime_day": "Thursday", "dropoff_datetime_month": "April",
+    "average_speed": 9.0
+}
+
+
+def warm_up():
+    """Load the model and run one prediction so the first request doesn't pay for lazy setup.
+
+    Returns whether the service is warmed up; until then it reports unready,
+    with the reason in `load_error`. In a serving process, the process pool
+    and the shadow thread are started once warm.
+    """
+    global warmed_up, load_error
+    with warm_up_lock:
+        start = time.perf_counter()
+        try:
+            # Also restarts the bundle watcher thread in a worker forked after warming up
+            registry.load()
+            if not registry.ready:
+                load_error = "No model published yet"
+                return False
+            if not warmed_up:
+                perform_prediction([WARMUP_RECORD])
+                warmed_up = True
+                load_error = None
+                logging.info(f"Model loaded and warmed up in {time.perf_counter() - start:.2f}s")
+                load_shadow()
+        except Exception as e:
+            load_error = str(e)
+            logging.error(f"Model loading failed: {e}")
+            return False
+        if serving_process:
+            start_workers()
+        return True
 
 
-mlflow.set_tracking_uri('http://127.0.0.1:1234')
+def start_workers():
+    """Start what cannot cross a fork: the process pool and the shadow thread."""
+    start_process_pool()
+    if shadow is not None:
+        shadow.start()
 
-model_name = "GradientBoostingRegressor"
-model_stage = "Staging"
-model_uri = f"models:/{model_name}/{model_stage}"
 
-mlflow_model = mlflow.pyfunc.load_model(model_uri=model_uri)
+def warm_up_worker():
+    """`warm_up` in a serving process, retried every `load_retry_interval` seconds until it succeeds.
+
+    In `bundle` mode there is nothing to retry: the bundle watcher calls
+    `model_reloaded` once a bundle is published.
+
+    The prefork master only calls `warm_up`; every serving process runs this
+    from its lifespan, so under the prefork server each worker starts its own
+    process pool and shadow thread after the fork.
+    """
+    global serving_process
+    serving_process = True
+    app_config = registry.config['prediction_app']
+    retry_interval = app_config['load_retry_interval']
+    while not warm_up():
+        if app_config['model_source'] == 'bundle':
+            return
+        logging.warning(f"Model not ready ({load_error}), retrying in {retry_interval}s")
+        if shutting_down.wait(retry_interval):
+            return
+
+
+def model_reloaded(bundle):
+    """Called on the bundle watcher thread with each hot-swapped bundle.
+
+    A bundle published after a startup that found no model (or failed)
+    completes the warm-up and makes the service ready; later swaps only
+    warm the new model.
+    """
+    if not warmed_up:
+        warm_up()
+        return
+    try:
+        perform_prediction([WARMUP_RECORD])
+    except Exception as e:
+        logging.error(f"Warm-up of bundle '{bundle.version}' failed: {e}")
+
+
+def start_process_pool():
+    """Start the inference worker processes; until then, or if they fail, batches are scored in-process."""
+    global process_pool
+    app_config = registry.config['prediction_app']
+    pool_config = app_config['process_pool']
+    if not pool_config['enabled'] or process_pool is not None:
+        return
+    start = time.perf_counter()
+    try:
+        pool = ProcessPoolBackend(workers=pool_config['workers'], min_rows=pool_config['min_rows'],
+                                  slot_rows=pool_config['slot_rows'],
+                                  verify_checksums=app_config['verify_checksums'],
+                                  bundle_dir=registry.predictor.bundle_dir)
+        process_pool = pool.start()
+    except Exception as e:
+        logging.error(f"Process pool backend failed to start, scoring in-process: {e}")
+        return
+    logging.info(f"Process pool backend started with {process_pool.workers} workers "
+                 f"in {time.perf_counter() - start:.2f}s")
+
+
+def load_shadow():
+    """Load the configured candidate model; a failure only disables shadow scoring."""
+    global shadow
+    shadow_config = registry.config['prediction_app']['shadow']
+    if not shadow_config['enabled'] or shadow is not None:
+        return
+    try:
+        candidate = registry.load_candidate()
+    except Exception as e:
+        logging.error(f"Shadow model loading failed, shadow scoring disabled: {e}")
+        return
+    if candidate is None:
+        logging.warning("Shadow scoring enabled but no shadow bundle or registry_stage configured")
+        return
+    shadow = ShadowEvaluator(candidate, capacity=shadow_config['capacity_rows'],
+                             sample_rate=shadow_config['sample_rate'],
+                             window=shadow_config['window_rows'])
+
+
+def is_ready():
+    return warmed_up and registry.ready
+
+
+def enforce_schema(result):
+    """Count rows outside the training schema and, in reject mode, refuse them with SchemaViolation."""
+    if not result.n_invalid:
+        return
+    for field, count in result.field_counts().items():
+        VALIDATION_ERRORS.labels(field=field).inc(count)
+    if registry.config['prediction_app']['validation']['mode'] == 'reject':
+        raise SchemaViolation(result)
+
+
+def validation_errors(e, limit=None):
+    """Pydantic errors as plain JSON-serializable dicts.
+
+    The offending input is left out: for malformed JSON it is the raw bytes
+    of the line or body, which can neither be serialized nor be worth echoing.
+    """
+    return e.errors(include_url=False, include_context=False, include_input=False)[:limit]
+
+
+def require_ready():
+    if not is_ready():
+        raise HTTPException(status_code=503, detail="Model is not loaded yet", headers={"Retry-After": "1"})
+
+
+def request_deadline(request):
+    """Deadline (perf_counter time) from the optional X-Request-Timeout-Ms header, counted from arrival."""
+    timeout_ms = request.headers.get('x-request-timeout-ms')
+    if timeout_ms is None:
+        return None
+    try:
+        return request.state.request_start + float(timeout_ms) / 1000
+    except ValueError:
+        raise HTTPException(status_code=400, detail="X-Request-Timeout-Ms must be a number of milliseconds")
+
+
+@asynccontextmanager
+async def admitted(request):
+    """Hold an admission slot for the block; shed with 503 or 504 before any model work."""
+    deadline = request_deadline(request)
+    try:
+        if admission is not None:
+            await admission.acquire(deadline)
+        else:
+            check_deadline(deadline)
+    except Overloaded as e:
+        retry_after = registry.config['prediction_app']['admission']['retry_after_seconds']
+        raise HTTPException(status_code=503, detail=f"Server overloaded: {e}", headers={"Retry-After": str(retry_after)})
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+    try:
+        yield deadline
+    finally:
+        if admission is not None:
+            admission.release()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global batcher, prediction_cache, admission, prediction_log, request_validator, warm_up_task
+    registry.read_config()
+    registry.on_reload = model_reloaded
+    shutting_down.clear()
+    warm_up_task = asyncio.create_task(run_in_threadpool(warm_up_worker))
+
+    validation_config = registry.config['prediction_app']['validation']
+    if validation_config['mode'] not in ('off', 'warn', 'reject'):
+        raise ValueError(f"Unknown validation mode '{validation_config['mode']}', expected off, warn or reject")
+    if validation_config['mode'] != 'off':
+        request_validator = SchemaValidator.from_files(validation_config['schema'], fields=InputData.model_fields)
+
+    admission_config = registry.config['prediction_app']['admission']
+    if admission_config['enabled']:
+        admission = AdmissionController(max_in_flight=admission_config['max_in_flight'],
+                                        max_queue=admission_config['max_queue'],
+                                        max_queue_wait=admission_config['max_queue_wait_ms'] / 1000)
+
+    logging_config = registry.config['prediction_app']['prediction_log']
+    if logging_config['enabled']:
+        feature_types = {name: field.annotation for name, field in InputData.model_fields.items()}
+        prediction_log = PredictionLogSink(logging_config['directory'], feature_types,
+                                           capacity=logging_config['capacity_rows'],
+                                           flush_rows=logging_config['flush_rows'],
+                                           flush_interval=logging_config['flush_interval_seconds']).start()
+
+    caching = registry.config['prediction_app']['prediction_cache']
+    if caching['enabled']:
+        prediction_cache = PredictionCache(max_entries=caching['max_entries'],
+                                           ttl=caching['ttl_seconds'],
+                                           quantize_decimals=caching['quantize_decimals'])
+
+    batching = registry.config['prediction_app']['micro_batching']
+    if batching['enabled']:
+        batcher = MicroBatcher(functools.partial(perform_prediction, use_cache=True),
+                               max_batch_size=batching['max_batch_size'],
+                               max_wait=batching['max_wait_ms'] / 1000,
+                               workers=batching['workers']).start()
+    yield
+    shutting_down.set()
+    await asyncio.gather(warm_up_task, return_exceptions=True)
+    if batcher is not None:
+        await batcher.stop()
+    if prediction_log is not None:
+        await run_in_threadpool(prediction_log.close)
+    if shadow is not None:
+        await run_in_threadpool(shadow.close)
+    if process_pool is not None:
+        await run_in_threadpool(process_pool.close)
+    registry.close()
+
+
+# app = FastAPI()
+app = FastAPI(template_directory="prediction_app/templates", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+# Per-stage latency histograms, exposed with the request metrics on /metrics
+PARSE_LATENCY = STAGE_LATENCY.labels(stage='parse')
+QUEUE_LATENCY = STAGE_LATENCY.labels(stage='queue')
+MAP_LATENCY = STAGE_LATENCY.labels(stage='map')
+CACHE_LATENCY = STAGE_LATENCY.labels(stage='cache')
+PROCESS_POOL_LATENCY = STAGE_LATENCY.labels(stage='process_pool')
 
 
 class InputData(BaseModel):
@@ -46,92 +342,387 @@ class InputData(BaseModel):
     average_speed: float
 
 
+# Batches are validated straight from the raw body into plain dicts in one pydantic call
+TripRecord = TypedDict('TripRecord', InputData.__annotations__)
+trip_batch_adapter = TypeAdapter(List[TripRecord])
+trip_record_adapter = TypeAdapter(TripRecord)
+
+
+@app.get('/health')
+async def health():
+    return {"status": "ok"}
+
+
+@app.get('/ready')
+async def ready():
+    if not is_ready():
+        return JSONResponse(status_code=503, headers={"Retry-After": "1"},
+                            content={"ready": False, "error": load_error})
+    return {"ready": True, "model_version": registry.predictor.version}
+
+
 @app.post('/predict')
-async def predict(input_data: InputData):
-    try:
-        df_mapped = await run_in_threadpool(map_data_to_df, input_data.dict())
+async def predict(input_data: InputData, request: Request):
+    # Body read and pydantic validation happen before the handler runs
+    PARSE_LATENCY.observe(time.perf_counter() - request.state.request_start)
+    require_ready()
+    record = input_data.dict()
+    if request_validator is not None:
+        try:
+            enforce_schema(request_validator.check_records([record], registry.predictor.feature_mapper))
+        except SchemaViolation as e:
+            raise HTTPException(status_code=422, detail=e.result.row_errors())
+    async with admitted(request) as deadline:
+        try:
+            if batcher is not None:
+                prediction = await batcher.submit(record, deadline)
+            else:
+                prediction = await run_in_threadpool_timed(perform_prediction, [record], True,
+                                                           deadline=deadline)
+
+            return {"prediction": prediction.tolist()}
+        except DeadlineExceeded as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post('/batch_predict', openapi_extra={
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": {"type": "array", "items": {"$ref": "#/components/schemas/InputData"}}},
+            ARROW_STREAM: {"schema": {"type": "string", "format": "binary"}}
+        }
+    }
+})
+async def batch_predict(request: Request):
+    """Score a JSON array of trips or an Arrow IPC stream of feature columns.
+
+    Predictions are returned as JSON, or as an Arrow IPC stream with one
+    `prediction` column when the Accept header asks for Arrow.
+    """
+    require_ready()
+    body = await read_body(request, registry.config['prediction_app']['max_batch_bytes'])
+    async with admitted(request) as deadline:
+        arrow_input = request.headers.get('content-type', '').startswith(ARROW_STREAM)
+        arrow_output = ARROW_STREAM in request.headers.get('accept', '')
+        try:
+            return await run_in_threadpool_timed(score_batch, body, arrow_input, arrow_output, deadline=deadline)
+        except DeadlineExceeded as e:
+            raise HTTPException(status_code=504, detail=str(e))
+
+
+@app.post('/predict/stream', openapi_extra={
+    "requestBody": {
+        "required": True,
+        "content": {"application/x-ndjson": {"schema": {"$ref": "#/components/schemas/InputData"}}}
+    }
+})
+async def predict_stream(request: Request):
+    """Score newline-delimited JSON trips, streaming one NDJSON result line per trip.
+
+    Input is consumed `chunk_size` lines at a time and the next chunk is only
+    read once the previous results have been handed to the client, so a slow
+    reader slows down reading and memory stays bounded by one chunk.
+    """
+    require_ready()
+    streaming = registry.config['prediction_app']['streaming']
+    return RequestStreamingResponse(stream_predictions(request.stream(), streaming['chunk_size'], streaming['max_line_bytes']),
+                             media_type='application/x-ndjson')
+
+
+@app.get('/stats/batcher')
+async def batcher_stats():
+    if batcher is None:
+        raise HTTPException(status_code=404, detail="Micro-batching is disabled")
+    return batcher.stats()
+
+
+@app.get('/stats/admission')
+async def admission_stats():
+    if admission is None:
+        raise HTTPException(status_code=404, detail="Admission control is disabled")
+    return admission.stats()
+
+
+@app.get('/stats/prediction_log')
+async def prediction_log_stats():
+    if prediction_log is None:
+        raise HTTPException(status_code=404, detail="Prediction logging is disabled")
+    return prediction_log.stats()
+
+
+@app.get('/stats/shadow')
+async def shadow_stats():
+    if shadow is None:
+        raise HTTPException(status_code=404, detail="Shadow scoring is disabled")
+    return shadow.stats()
+
+
+@app.get('/stats/process_pool')
+async def process_pool_stats():
+    if process_pool is None:
+        raise HTTPException(status_code=404, detail="Process pool backend is disabled")
+    return process_pool.stats()
+
+
+@app.get('/stats/cache')
+async def cache_stats():
+    if prediction_cache is None:
+        raise HTTPException(status_code=404, detail="Prediction cache is disabled")
+    return prediction_cache.stats()
+
+
+@app.get('/metrics')
+async def metrics():
+    """Request, stage latency and model metrics in the Prometheus text format."""
+    MODEL_INFO.clear()
+    if is_ready():
+        MODEL_INFO.labels(model_version=registry.predictor.version).set(1)
+    return PlainTextResponse(render_metrics(), media_type='text/plain; version=0.0.4')
+
+
+@app.get('/stats/process')
+async def process_stats():
+    # Under the prefork server each worker reports its own memory
+    return {"pid": os.getpid(), "memory": process_memory(os.getpid())}
+
 
-        prediction = await run_in_threadpool(perform_prediction, df_mapped)
+async def read_body(request, max_bytes):
+    """The request body, refused with 413 as soon as it is known to be larger than `max_bytes`.
 
-        return {"prediction": prediction.tolist()}
+    A declared Content-Length is checked before anything is read, and a
+    chunked body is counted as it arrives, so an oversized batch is never
+    buffered whole nor parsed.
+    """
+    content_length = request.headers.get('content-length', '')
+    if content_length.isdigit() and int(content_length) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Body of {content_length} bytes exceeds the limit of {max_bytes}")
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Body exceeds the limit of {max_bytes} bytes")
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+
+def run_in_threadpool_timed(func, *args, deadline=None):
+    """run_in_threadpool, recording how long the call waited for a free thread.
+
+    Raises DeadlineExceeded instead of calling `func` if `deadline` passed
+    while it waited.
+    """
+    submitted = time.perf_counter()
+
+    def timed():
+        QUEUE_LATENCY.observe(time.perf_counter() - submitted)
+        check_deadline(deadline)
+        return func(*args)
+    return run_in_threadpool(timed)
+
+
+def score_batch(body, arrow_input=False, arrow_output=False):
+    """Validate, map and predict a batch of trips with a single model call."""
+    start = time.perf_counter()
+    max_batch_size = registry.config['prediction_app']['max_batch_size']
+    if arrow_input:
+        try:
+            table = read_arrow_table(body)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        n_rows = table.num_rows
+    else:
+        try:
+            records = trip_batch_adapter.validate_json(body)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=validation_errors(e, limit=20))
+        n_rows = len(records)
+
+    if n_rows > max_batch_size:
+        raise HTTPException(status_code=413, detail=f"Batch of {n_rows} trips exceeds the limit of {max_batch_size}")
+    if n_rows == 0:
+        # Nothing to score, and the scalers refuse empty input
+        return batch_response(np.empty((0, 1)), 0, start, arrow_output)
+
+    if arrow_input:
+        # Read once so the columns are checked against the model that scores them
+        predictor = registry.predictor
+        mapper = predictor.feature_mapper
+        try:
+            columns = arrow_feature_columns(table, mapper.numeric_fields, mapper.onehot_fields)
+            if request_validator is not None:
+                enforce_schema(request_validator.check_columns(columns, n_rows, mapper))
+        except SchemaViolation as e:
+            raise HTTPException(status_code=422, detail=e.result.row_errors())
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+    try:
+        if arrow_input:
+            scoring_start = time.perf_counter()
+            with MAP_LATENCY.time():
+                features = mapper.map_columns(columns, n_rows)
+            PREDICTIONS.labels(model_version=predictor.version).inc(n_rows)
+            predictions = predict_features(predictor, features)
+            record_served(table, predictions, predictor, time.perf_counter() - scoring_start)
+        else:
+            predictions = perform_prediction(records, validate=True)
+    except SchemaViolation as e:
+        raise HTTPException(status_code=422, detail=e.result.row_errors())
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    return batch_response(predictions, n_rows, start, arrow_output)
+
+
+def batch_response(predictions, n_rows, start, arrow_output=False):
+    elapsed = time.perf_counter() - start
+    rows_per_sec = n_rows / elapsed if elapsed > 0 else None
+    if arrow_output:
+        return Response(content=write_arrow_predictions(predictions), media_type=ARROW_STREAM,
+                        headers={"X-Rows": str(n_rows), "X-Rows-Per-Sec": str(rows_per_sec)})
+    return {
+        "predictions": predictions.tolist(),
+        "rows": n_rows,
+        "rows_per_sec": rows_per_sec
+    }
+
+
+class RequestStreamingResponse(StreamingResponse):
+    """StreamingResponse for generators that keep reading the request body.
+
+    The stock response may watch for a disconnect by calling `receive`,
+    which would swallow body chunks; here a disconnect surfaces through
+    `request.stream()` in the generator instead.
+    """
 
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
 
-async def batch_predict(input_data_list: List[InputData]):
+
+async def read_ndjson_chunks(body_stream, chunk_size, max_line_bytes):
+    """Yield lists of up to `chunk_size` non-empty lines from a request body stream."""
+    lines = []
+    partial = b''
+    async for data in body_stream:
+        *complete, partial = (partial + data).split(b'\n')
+        if len(partial) > max_line_bytes:
+            raise ValueError(f"Line longer than {max_line_bytes} bytes")
+        lines.extend(line for line in complete if line.strip())
+        while len(lines) >= chunk_size:
+            yield lines[:chunk_size]
+            lines = lines[chunk_size:]
+    if partial.strip():
+        lines.append(partial)
+    if lines:
+        yield lines
+
+
+def score_ndjson_chunk(lines, first_record):
+    """Validate and predict one chunk of NDJSON lines, returning one result line per input line."""
+    records = None
     try:
-        
-        df_list = [await run_in_threadpool(map_data_to_df, input_data.dict()) for input_data in input_data_list]
-        df_batch = pd.concat(df_list, ignore_index=True)
-        predictions = await run_in_threadpool(perform_prediction, df_batch)
-        
-        return {"predictions": predictions.tolist()}
+        records = trip_batch_adapter.validate_json(b'[' + b','.join(lines) + b']')
+    except ValidationError:
+        pass
+
+    errors = {}
+    # A line holding several comma-separated objects would shift rows, so recheck line by line
+    if records is None or len(records) != len(lines):
+        records = []
+        for i, line in enumerate(lines):
+            try:
+                records.append(trip_record_adapter.validate_json(line))
+            except ValidationError as e:
+                errors[i] = validation_errors(e)
+
+    try:
+        try:
+            predictions = perform_prediction(records, validate=True) if records else np.empty((0, 1))
+        except SchemaViolation as e:
+            # Report the offending lines and score the rest
+            record_lines = [i for i in range(len(lines)) if i not in errors]
+            invalid = e.result.invalid_rows
+            for row in e.result.row_errors(limit=None):
+                errors[record_lines[row['row']]] = f"Outside the training data schema: {', '.join(row['fields'])}"
+            records = [record for record, is_invalid in zip(records, invalid) if not is_invalid]
+            predictions = perform_prediction(records) if records else np.empty((0, 1))
+        predictions = iter(predictions[:, 0].tolist())
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        errors = {i: str(e) for i in range(len(lines))}
 
-def map_data_to_df(input_data):
-    keys_list = [
-        'trip_miles', 'trip_time', 'duration_minutes', 'wait_time_minutes', 'service_time_minutes', 'average_speed',
-        'request_datetime_hour', 'on_scene_datetime_hour', 'pickup_datetime_hour', 'dropoff_datetime_hour',
-        'request_datetime_day_Friday', 'request_datetime_day_Monday',
-        'request_datetime_day_Saturday', 'request_datetime_day_Sunday', 'request_datetime_day_Thursday',
-        'request_datetime_day_Tuesday', 'request_datetime_day_Wednesday', 'on_scene_datetime_day_Friday',
-        'on_scene_datetime_day_Monday', 'on_scene_datetime_day_Saturday', 'on_scene_datetime_day_Sunday',
-        'on_scene_datetime_day_Thursday', 'on_scene_datetime_day_Tuesday', 'on_scene_datetime_day_Wednesday',
-        'pickup_datetime_day_Friday', 'pickup_datetime_day_Monday', 'pickup_datetime_day_Saturday',
-        'pickup_datetime_day_Sunday', 'pickup_datetime_day_Thursday', 'pickup_datetime_day_Tuesday',
-        'pickup_datetime_day_Wednesday', 'dropoff_datetime_day_Friday', 'dropoff_datetime_day_Monday',
-        'dropoff_datetime_day_Saturday', 'dropoff_datetime_day_Sunday', 'dropoff_datetime_day_Thursday',
-        'dropoff_datetime_day_Tuesday', 'dropoff_datetime_day_Wednesday'
-    ]
-
-    df_mapped = pd.DataFrame(columns=keys_list, index=[0]).fillna(0)
-
-    for key, value in input_data.items():
-        if key in df_mapped.columns:
-            df_mapped[key] = value
-
-    days_columns = [
-        'request_datetime_day', 'on_scene_datetime_day',
-        'pickup_datetime_day', 'dropoff_datetime_day'
-    ]
-    for col in days_columns:
-        if col in input_data:
-            column_name = f"{col}_{input_data[col]}"
-            if column_name in df_mapped.columns:
-                df_mapped[column_name] = 1
-
-    return df_mapped
-
-
-def perform_prediction(data):
-
-    continuous_cols = [
-    'trip_miles', 'trip_time', 'duration_minutes',
-    'wait_time_minutes', 'service_time_minutes', 'average_speed'
-    ]
+    results = [{"record": first_record + i, "error": errors[i]} if i in errors else {"prediction": next(predictions)}
+               for i in range(len(lines))]
+    return ''.join(json.dumps(result) + '\n' for result in results).encode()
+
+
+async def stream_predictions(body_stream, chunk_size, max_line_bytes):
+    n_records = 0
     try:
-        config_path = 'parameters.yaml'
+        async for lines in read_ndjson_chunks(body_stream, chunk_size, max_line_bytes):
+            yield await run_in_threadpool(score_ndjson_chunk, lines, n_records)
+            n_records += len(lines)
+    except ClientDisconnect:
+        logging.info(f"Client disconnected after {n_records} streamed records")
+    except ValueError as e:
+        # Headers are already sent, so the error is reported in-band and the stream ends
+        yield (json.dumps({"record": n_records, "error": str(e)}) + '\n').encode()
 
-        with open(config_path, 'r') as file:
-            config = yaml.safe_load(file)
 
-        base_dir = os.path.dirname(config_path)
-        X_scaler_path = os.path.join(base_dir, config['prediction_app']['scaler'], "X_scaler.pkl")
-        y_scaler_path = os.path.join(base_dir, config['prediction_app']['scaler'], "y_scaler.pkl")
+def predict_features(predictor, features):
+    """Score a mapped feature matrix, in the process pool when the batch is large enough."""
+    if process_pool is not None and process_pool.accepts(predictor, len(features)):
+        with PROCESS_POOL_LATENCY.time():
+            return process_pool.predict_matrix(predictor, features)
+    return predictor.predict_matrix(features)
 
-        with open(X_scaler_path, 'rb') as f:
-            X_scaler = pickle.load(f)
-        with open(y_scaler_path, 'rb') as f:
-            y_scaler = pickle.load(f)
 
-        data[continuous_cols] = X_scaler.transform(data[continuous_cols])
-        prediction = mlflow_model.predict(data)
-        inverse_transformed_y = y_scaler.inverse_transform(prediction.reshape(-1, 1))
+def record_served(features, predictions, predictor, latency):
+    """Hand a scored batch to the prediction log and the shadow model; both only enqueue it."""
+    if prediction_log is not None:
+        prediction_log.log(features, predictions, predictor.version, latency)
+    if shadow is not None:
+        shadow.submit(features, predictions, predictor.version, latency)
 
-        return inverse_transformed_y
-    except Exception as e:
-        raise e
+
+def perform_prediction(records, use_cache=False, validate=False):
+    """Map a list of trip dicts into one feature matrix and predict it in a single call.
+
+    With `use_cache`, rows already in the prediction cache are served from
+    it and only the misses reach the model. With `validate`, the mapped
+    matrix is checked against the schema before scoring (see `enforce_schema`).
+    """
+    # Read the predictor once so a concurrent hot swap can't mix model versions
+    predictor = registry.predictor
+    scoring_start = time.perf_counter()
+    with MAP_LATENCY.time():
+        features = predictor.feature_mapper.map_records(records)
+    if validate and request_validator is not None:
+        enforce_schema(request_validator.check_matrix(features, predictor.feature_mapper))
+    if not use_cache or prediction_cache is None:
+        PREDICTIONS.labels(model_version=predictor.version).inc(len(records))
+        predictions = predict_features(predictor, features)
+        record_served(records, predictions, predictor, time.perf_counter() - scoring_start)
+        return predictions
+
+    with CACHE_LATENCY.time():
+        keys = prediction_cache.make_keys(features, predictor.feature_mapper.continuous_index)
+        cached = prediction_cache.lookup(keys, predictor.version)
+    missing = [i for i, value in enumerate(cached) if value is None]
+    PREDICTIONS.labels(model_version=predictor.version).inc(len(missing))
+
+    predictions = np.empty((len(records), 1), dtype=np.float64)
+    if missing:
+        computed = predict_features(predictor, features[missing])
+        predictions[missing] = computed
+        prediction_cache.store([keys[i] for i in missing], computed[:, 0].tolist(), predictor.version)
+    for i, value in enumerate(cached):
+        if value is not None:
+            predictions[i, 0] = value
+    record_served(records, predictions, predictor, time.perf_counter() - scoring_start)
+    return predictions
 
 """
 {
@@ -1,10 +1,20 @@
 import os
 import json
+import time
+import argparse
 import numpy as np
 import logging
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor
 from modules.data_loader import read_data
 from modules.read_config import read_config
 from modules.logger_configurator import configure_logger
+from modules.sketches import HyperLogLog, CountMinSketch, hash_values
+
+# String columns read back as 'str' under pandas 3
+CATEGORICAL_DTYPES = ('object', 'category', 'str', 'string')
 
 # class SchemaBuilder:
 #     def __init__(self, config):
@@ -81,9 +91,26 @@ from modules.data_loader import read_data
 from modules.logger_configurator import configure_logger
 
 class SchemaBuilder:
-    def __init__(self):
-        pass
-        
+    """Describe a feature parquet as `<file>_schema.json` (dtype, range or top category per column).
+
+    `method='full'` loads the data and uses `df.describe`. The default
+    `method='metadata'` writes the same format without loading the frame:
+    dtypes come from the Arrow schema and numeric min/max from the row group
+    statistics in the parquet footer, so no numeric data page is decoded.
+    Only the string columns are streamed, in `batch_size` row batches,
+    into a HyperLogLog (distinct count) and a count-min sketch (most
+    frequent value and its frequency). Distinct counts are exact up to
+    10000 values and close estimates beyond, like the top frequencies of
+    high-cardinality columns.
+    """
+
+    def __init__(self, method='metadata', batch_size=1000000, workers=0):
+        if method not in ('metadata', 'full'):
+            raise ValueError(f"Unknown schema method '{method}', expected metadata or full")
+        self.method = method
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 1
+
     def _generate_schema(self, df):
         schema = {}
         df_describe = df.describe(include='all')
@@ -97,7 +124,7 @@ class SchemaBuilder:
                 if 'datetime' in data_type.lower():
                     schema[column] = {'data_type': data_type }
 
-                elif data_type in ('object','category'):
+                elif data_type in CATEGORICAL_DTYPES:
                     top_value = df_describe[column]['top']  
                     freq_value = df_describe[column]['freq'] 
                     unique_values_count = df[column].nunique()  
@@ -118,6 +145,94 @@ class SchemaBuilder:
                 logging.error(f"Column not found: {ke}")
         return schema
 
+    @staticmethod
+    def _footer_ranges(parquet_file, columns):
+        """Min/max per column from the row group statistics; row groups without them are read."""
+        metadata = parquet_file.metadata
+        positions = {metadata.schema.column(i).name: i for i in range(metadata.num_columns)}
+        ranges = {}
+        for column in columns:
+            low, high, unread = None, None, []
+            for row_group in range(metadata.num_row_groups):
+                statistics = metadata.row_group(row_group).column(positions[column]).statistics
+                if statistics is None or not statistics.has_min_max:
+                    unread.append(row_group)
+                    continue
+                low = statistics.min if low is None else min(low, statistics.min)
+                high = statistics.max if high is None else max(high, statistics.max)
+            if unread:
+                min_max = pc.min_max(parquet_file.read_row_groups(unread, columns=[column]).column(0)).as_py()
+                if min_max['min'] is not None:
+                    low = min_max['min'] if low is None else min(low, min_max['min'])
+                    high = min_max['max'] if high is None else max(high, min_max['max'])
+            ranges[column] = (None if low is None else float(low), None if high is None else float(high))
+        return ranges
+
+    @staticmethod
+    def _value_counts(array):
+        """Distinct non-null values of one batch column and their counts."""
+        if pa.types.is_dictionary(array.type):
+            # Count dictionary codes, then look up just the distinct values
+            counted = pc.value_counts(array.indices)
+            codes, counts = counted.field('values'), counted.field('counts')
+            valid = pc.is_valid(codes)
+            values = array.dictionary.take(codes.filter(valid))
+            counts = counts.filter(valid)
+        else:
+            counted = pc.value_counts(array)
+            values, counts = counted.field('values'), counted.field('counts')
+            valid = pc.is_valid(values)
+            values, counts = values.filter(valid), counts.filter(valid)
+        return np.asarray(values.to_pylist(), dtype=object), counts.to_numpy()
+
+    def _sketch_categories(self, parquet_file, columns):
+        """Stream the string columns into a distinct-count and a frequency sketch each."""
+        sketches = {column: (HyperLogLog(), CountMinSketch()) for column in columns}
+        for batch in parquet_file.iter_batches(batch_size=self.batch_size, columns=columns):
+            for column in columns:
+                values, counts = self._value_counts(batch.column(column))
+                if not len(values):
+                    continue
+                hashes = hash_values(values)
+                distinct, frequencies = sketches[column]
+                distinct.add_hashes(hashes)
+                frequencies.add(values, counts, hashes=hashes)
+        return sketches
+
+    def _generate_schema_from_metadata(self, file_path):
+        parquet_file = pq.ParquetFile(file_path)
+        # An empty table converts with the same pandas metadata a full read would use
+        dtypes = parquet_file.schema_arrow.empty_table().to_pandas().dtypes
+
+        numeric = [column for column, dtype in dtypes.items()
+                   if str(dtype) not in CATEGORICAL_DTYPES and str(dtype) != 'bool' and 'datetime' not in str(dtype).lower()]
+        categorical = [column for column, dtype in dtypes.items() if str(dtype) in CATEGORICAL_DTYPES]
+        ranges = self._footer_ranges(parquet_file, numeric)
+        sketches = self._sketch_categories(parquet_file, categorical) if categorical else {}
+
+        schema = {}
+        for column, dtype in dtypes.items():
+            data_type = str(dtype)
+            if 'datetime' in data_type.lower():
+                schema[column] = {'data_type': data_type}
+            elif column in sketches:
+                distinct, frequencies = sketches[column]
+                top = frequencies.most_common(1)
+                schema[column] = {
+                    'data_type': data_type,
+                    'unique_values_count': distinct.count(),
+                    'most_frequent_value': top[0][0] if top else None,
+                    'frequency_of_most_frequent': top[0][1] if top else None
+                }
+            else:
+                min_value, max_value = ranges.get(column, (None, None))
+                schema[column] = {
+                    'data_type': data_type,
+                    'min_value': min_value,
+                    'max_value': max_value
+                }
+        return schema
+
     def _write_schema_to_file(self, schema, schema_file_path):
 
         if not os.path.exists(os.path.dirname(schema_file_path)):
@@ -129,8 +244,26 @@ class SchemaBuilder:
                         default=lambda o: int(o) if isinstance(o, (np.int64, np.int32)) else o,
                         indent=4)
 
+    def _save_file_schema(self, file_path):
+        """Write `<file>_schema.json` next to one parquet file with the metadata method."""
+        start = time.perf_counter()
+        schema = self._generate_schema_from_metadata(file_path)
+        schema_file_path = file_path + "_schema.json"
+        self._write_schema_to_file(schema, schema_file_path)
+        logging.info(f"Schema written to '{schema_file_path}' in {time.perf_counter() - start:.2f}s")
+        return schema_file_path
+
     def generate_and_save_schema(self, df_path):
         try:
+            if self.method == 'metadata':
+                # Same file `read_data` would pick, without loading it
+                filename = next((file for file in os.listdir(df_path) if file.endswith(".parquet")), None)
+                if filename is None:
+                    logging.warning(f"No data file found in {df_path}.")
+                    return
+                self._save_file_schema(os.path.join(df_path, filename))
+                return
+
             df, filename = read_data(df_path)
             schema = self._generate_schema(df)
             schema_file_name= filename+"_schema.json"
@@ -142,10 +275,40 @@ class SchemaBuilder:
         except Exception as e:
             logging.error(f"Unable to write input schema. Error: {e}")
 
+    def generate_and_save_schemas(self, df_path):
+        """Write a schema for every parquet file in df_path, `workers` files at a time."""
+        if self.method == 'full':
+            logging.warning("The full method loads one file per schema; building only the first file's schema")
+            return self.generate_and_save_schema(df_path)
+
+        file_paths = sorted(os.path.join(df_path, file) for file in os.listdir(df_path) if file.endswith(".parquet"))
+        start = time.perf_counter()
+        written = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self._save_file_schema, file_path): file_path for file_path in file_paths}
+            for future, file_path in futures.items():
+                try:
+                    written.append(future.result())
+                except Exception as e:
+                    logging.error(f"Unable to write schema for '{file_path}'. Error: {e}")
+        logging.info(f"Wrote {len(written)} of {len(file_paths)} schemas in {time.perf_counter() - start:.2f}s")
+        return written
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default="parameters.yaml", help="Path to the configuration file")
+    parser.add_argument("--all", action='store_true', help="Build a schema for every parquet file, not just the first")
+    args = parser.parse_args()
+
     configure_logger()
-    config = read_config('parameters.yaml')
+    config = read_config(args.config)
     df_path= config['data']['feature_engineered']
-    schema_instance = SchemaBuilder()
-    schema_instance.generate_and_save_schema(df_path)
+    schema_config = config['schema_builder']
+    schema_instance = SchemaBuilder(method=schema_config['method'],
+                                    batch_size=schema_config['batch_size'],
+                                    workers=schema_config['workers'])
+    if args.all:
+        schema_instance.generate_and_save_schemas(df_path)
+    else:
+        schema_instance.generate_and_save_schema(df_path)
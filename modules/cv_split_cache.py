@@ -0,0 +1,78 @@
+import os
+import json
+import shutil
+import tempfile
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import KFold
+
+
+class CVSplitCache:
+    """Materialise cross-validation folds once and reuse them across studies.
+
+    Folds are stored as contiguous float32 `.npy` arrays under a directory
+    keyed by a hash of the transformed dataset, so every model's study (and
+    any later rerun over unchanged data) memory-maps them instead of
+    re-splitting and copying the pandas frames.
+    """
+
+    def __init__(self, cache_dir, cv=5):
+        self.cache_dir = cache_dir
+        self.cv = cv
+
+    def _dataset_key(self, X, y):
+        """Hash the feature/target values, column layout and fold count."""
+        digest = hashlib.sha256()
+        digest.update(json.dumps([list(map(str, X.columns)), self.cv]).encode())
+        digest.update(pd.util.hash_pandas_object(X, index=False).values.tobytes())
+        digest.update(pd.util.hash_pandas_object(y, index=False).values.tobytes())
+        return digest.hexdigest()[:16]
+
+    def _write_folds(self, X, y, fold_dir):
+        """Split X, y into KFold arrays and save them atomically to fold_dir."""
+        # A staging directory of its own, so concurrent tuning runs never write into each other's
+        tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(fold_dir) + ".", suffix=".tmp",
+                                   dir=os.path.dirname(fold_dir))
+
+        X_values = np.ascontiguousarray(X.to_numpy(dtype=np.float32))
+        y_values = np.ascontiguousarray(y.to_numpy(dtype=np.float64))
+
+        for fold, (train_idx, valid_idx) in enumerate(KFold(n_splits=self.cv).split(X_values)):
+            np.save(os.path.join(tmp_dir, f"train_idx_{fold}.npy"), train_idx)
+            np.save(os.path.join(tmp_dir, f"valid_idx_{fold}.npy"), valid_idx)
+            np.save(os.path.join(tmp_dir, f"X_train_{fold}.npy"), X_values[train_idx])
+            np.save(os.path.join(tmp_dir, f"X_valid_{fold}.npy"), X_values[valid_idx])
+            np.save(os.path.join(tmp_dir, f"y_train_{fold}.npy"), y_values[train_idx])
+            np.save(os.path.join(tmp_dir, f"y_valid_{fold}.npy"), y_values[valid_idx])
+
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as file:
+            json.dump({"cv": self.cv, "n_rows": len(X_values), "columns": list(map(str, X.columns))}, file, indent=4)
+
+        try:
+            os.replace(tmp_dir, fold_dir)
+        except OSError:
+            # Another tuning process published the same folds first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _load_folds(self, fold_dir):
+        """Memory-map the cached fold arrays."""
+        def load(name, fold):
+            return np.load(os.path.join(fold_dir, f"{name}_{fold}.npy"), mmap_mode='r')
+
+        return [(load("X_train", fold), load("X_valid", fold), load("y_train", fold), load("y_valid", fold))
+                for fold in range(self.cv)]
+
+    def get_folds(self, X, y):
+        """Return a list of (X_train, X_valid, y_train, y_valid) tuples, one per fold."""
+        fold_dir = os.path.join(self.cache_dir, self._dataset_key(X, y))
+
+        if os.path.exists(os.path.join(fold_dir, "meta.json")):
+            logging.info(f"Reusing cached CV folds from '{fold_dir}'")
+        else:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._write_folds(X, y, fold_dir)
+            logging.info(f"Cached {self.cv} CV folds to '{fold_dir}'")
+
+        return self._load_folds(fold_dir)
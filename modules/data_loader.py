@@ -4,10 +4,35 @@ import pyarrow as pa
 import pyarrow.parquet as pq
 
 
+def _is_partitioned(directory):
+    """True for a hive-partitioned dataset (`key=value` subdirectories) or one of its partitions."""
+    if '=' in os.path.basename(os.path.normpath(directory)):
+        return True
+    return any('=' in entry and os.path.isdir(os.path.join(directory, entry)) for entry in os.listdir(directory))
+
+
 def read_data(directory):
+    """Read a parquet dataset from `directory`, returning the DataFrame and the name it was read from.
+
+    A flat directory yields its first parquet file. A partitioned directory,
+    such as the prediction logs' `date_hour=...` layout, or a single
+    partition of it is read whole: every part file is concatenated and
+    partition keys below it become columns. Hidden and `_`-prefixed files are
+    skipped, as Arrow does for datasets.
+    """
     if not os.path.exists(directory):
         logging.warning(f"Directory {directory} does not exist.")
         return None,'None'
+
+    if _is_partitioned(directory):
+        name = os.path.basename(os.path.normpath(directory))
+        try:
+            df = pq.read_table(directory).to_pandas()
+            logging.info(f"Successfully read partitioned dataset {directory}, shape {df.shape}")
+            return df, name
+        except Exception as e:
+            logging.error(f"Error reading partitioned dataset {directory}: {e}")
+            return None, 'None'
     
     for file in os.listdir(directory):
         if file.endswith(".parquet"):
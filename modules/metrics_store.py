@@ -0,0 +1,189 @@
+import os
+import json
+import sqlite3
+import logging
+import datetime
+import tempfile
+from contextlib import closing
+
+
+class MetricsStore:
+    """Append-only record of training runs in a SQLite database in WAL mode.
+
+    Each `append` is one short transaction, so any number of training and
+    tuning processes can record runs concurrently: WAL lets readers run
+    alongside the single writer, and writers queue on the database lock
+    for up to `timeout` seconds instead of overwriting each other's files.
+    Runs are indexed by model, run id and time, and every metric is also
+    a row of its own, so queries such as the best model by MAE over the
+    last N runs are answered from the indexes.
+
+    `export` writes the report JSON files DVC tracks (latest metrics and
+    hyperparameters per model, and the full history) from one snapshot.
+    """
+
+    def __init__(self, db_path, timeout=30.0):
+        self.db_path = db_path
+        self.timeout = timeout
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    run_id TEXT,
+                    timestamp TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    metrics TEXT NOT NULL,
+                    hyperparameters TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS run_metrics (
+                    run INTEGER NOT NULL REFERENCES runs(id),
+                    name TEXT NOT NULL,
+                    value REAL
+                );
+                CREATE INDEX IF NOT EXISTS runs_model_time ON runs(model, timestamp);
+                CREATE INDEX IF NOT EXISTS runs_run_id ON runs(run_id);
+                CREATE INDEX IF NOT EXISTS runs_time ON runs(timestamp);
+                CREATE INDEX IF NOT EXISTS run_metrics_name ON run_metrics(name, run);
+            """)
+
+    def _connect(self):
+        # Autocommit mode, so transactions are opened explicitly with BEGIN IMMEDIATE
+        return sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+
+    @staticmethod
+    def _record(row):
+        return {
+            "id": row[0],
+            "run_id": row[1],
+            "timestamp": row[2],
+            "model": row[3],
+            "metrics": json.loads(row[4]),
+            "hyperparameters": json.loads(row[5])
+        }
+
+    @staticmethod
+    def _insert(conn, model_name, metrics, hyperparameters, run_id, timestamp):
+        cursor = conn.execute(
+            "INSERT INTO runs (run_id, timestamp, model, metrics, hyperparameters) VALUES (?, ?, ?, ?, ?)",
+            (run_id, timestamp or str(datetime.datetime.now()), model_name,
+             json.dumps(metrics), json.dumps(hyperparameters)))
+        conn.executemany("INSERT INTO run_metrics (run, name, value) VALUES (?, ?, ?)",
+                         [(cursor.lastrowid, name, value) for name, value in metrics.items()])
+        return cursor.lastrowid
+
+    def append(self, model_name, metrics, hyperparameters, run_id=None, timestamp=None):
+        """Record one run atomically and return its row id."""
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row_id = self._insert(conn, model_name, metrics, hyperparameters, run_id, timestamp)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return row_id
+
+    def history(self, last_n=None, model_name=None):
+        """Runs in the order they were recorded, optionally only the last `last_n` and one model's."""
+        query = "SELECT id, run_id, timestamp, model, metrics, hyperparameters FROM runs"
+        params = []
+        if model_name is not None:
+            query += " WHERE model = ?"
+            params.append(model_name)
+        query += " ORDER BY id DESC"
+        if last_n is not None:
+            query += " LIMIT ?"
+            params.append(last_n)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [self._record(row) for row in reversed(rows)]
+
+    def best(self, metric='mae', last_n=None, minimize=True):
+        """The run with the lowest (or highest) `metric` among the last `last_n` runs, or None."""
+        order = "ASC" if minimize else "DESC"
+        recent = "SELECT id FROM runs ORDER BY id DESC" + (" LIMIT ?" if last_n is not None else "")
+        query = f"""
+            SELECT runs.id, run_id, timestamp, model, metrics, hyperparameters
+            FROM run_metrics JOIN runs ON runs.id = run_metrics.run
+            WHERE run_metrics.name = ? AND run_metrics.value IS NOT NULL AND run_metrics.run IN ({recent})
+            ORDER BY run_metrics.value {order}, runs.id DESC LIMIT 1
+        """
+        params = [metric] + ([last_n] if last_n is not None else [])
+        with closing(self._connect()) as conn:
+            row = conn.execute(query, params).fetchone()
+        return self._record(row) if row else None
+
+    def _latest_by_model(self, conn):
+        rows = conn.execute("""
+            SELECT id, run_id, timestamp, model, metrics, hyperparameters FROM runs
+            WHERE id IN (SELECT MAX(id) FROM runs GROUP BY model) ORDER BY model
+        """)
+        return {row[3]: self._record(row) for row in rows}
+
+    def latest_by_model(self):
+        """The most recent run of every model, keyed by model name."""
+        with closing(self._connect()) as conn:
+            return self._latest_by_model(conn)
+
+    def import_history(self, history_path):
+        """Load a metrics history JSON file (a list, or the older comma-terminated lines) into an empty store."""
+        with open(history_path, 'r') as file:
+            contents = file.read().strip()
+        if not contents:
+            return 0
+        records = json.loads(contents if contents.startswith('[') else '[' + contents.rstrip(',') + ']')
+        with closing(self._connect()) as conn:
+            # One transaction, so two processes starting together import the history once
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]:
+                    conn.execute("ROLLBACK")
+                    return 0
+                for record in records:
+                    self._insert(conn, record['model'], record['metrics'], record.get('hyperparameters', {}),
+                                 record.get('run_id'), record.get('timestamp'))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        logging.info(f"Imported {len(records)} runs from '{history_path}' into '{self.db_path}'")
+        return len(records)
+
+    @staticmethod
+    def _write_json(path, data):
+        # Write aside and rename, so readers never see a half-written file
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as file:
+                json.dump(data, file, indent=4)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def export(self, metrics_path, params_path, history_path=None):
+        """Write metrics.json and params.json (latest run per model) and the history as a JSON list."""
+        with closing(self._connect()) as conn:
+            # Hold the write lock while exporting, so concurrent exports land in commit order
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                latest = self._latest_by_model(conn)
+                self._write_json(metrics_path, {model: {"metrics": record["metrics"]}
+                                                for model, record in latest.items()})
+                self._write_json(params_path, {model: {"hyperparameters": record["hyperparameters"]}
+                                               for model, record in latest.items()})
+                if history_path is not None:
+                    rows = conn.execute("SELECT id, run_id, timestamp, model, metrics, hyperparameters FROM runs ORDER BY id")
+                    history = [self._record(row) for row in rows]
+                    self._write_json(history_path, [{"timestamp": record["timestamp"], "model": record["model"],
+                                                     "run_id": record["run_id"], "metrics": record["metrics"],
+                                                     "hyperparameters": record["hyperparameters"]}
+                                                    for record in history])
+            finally:
+                conn.execute("COMMIT")
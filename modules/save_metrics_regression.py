@@ -1,22 +1,35 @@
 import os
-import json
 import yaml
 import logging
-import datetime
+import functools
 
 from modules.logger_configurator import configure_logger
+from modules.metrics_store import MetricsStore
 
 configure_logger()
 
+@functools.lru_cache(maxsize=None)
 def read_yaml_config(file_path):
-    """Read and return the configuration from a YAML file."""
+    """Read and return the configuration from a YAML file (parsed once per path)."""
     with open(file_path, 'r') as file:
         return yaml.safe_load(file)
 
-    
-def save_metrics(model_name, model_params, rmse, mae, r2):
-    """Save metrics to json file"""
-    config = read_yaml_config('parameters.yaml')
+
+@functools.lru_cache(maxsize=None)
+def get_metrics_store(db_path, history_path=None):
+    """The metrics store at db_path, seeded from an existing history file the first time."""
+    store = MetricsStore(db_path)
+    if history_path and os.path.exists(history_path):
+        try:
+            store.import_history(history_path)
+        except (ValueError, KeyError) as e:
+            logging.warning(f"Unable to import metrics history from {history_path}. Error: {e}")
+    return store
+
+
+def save_metrics(model_name, model_params, rmse, mae, r2, config=None, run_id=None):
+    """Append the run to the metrics store and re-export the report json files"""
+    config = config or read_yaml_config('parameters.yaml')
     if not config:
                 logging.error("Failed to load configuration from parameters.yaml")
                 return
@@ -24,64 +37,19 @@ def save_metrics(model_name, model_params, rmse, mae, r2):
     params_file_path =config['reports']['params']
     metrics_file_path= config['reports']['metrics']
     metrics_history_path=config['reports']['metrics_history']
+    metrics_store_path=config['reports']['metrics_store']
 
-#Saving metrics history
     try:
-        """Saving metrics history"""
-        with open(metrics_history_path, "a") as file:
-            metrics = {
-                "timestamp": str(datetime.datetime.now()),
-                "model": model_name,
-                "metrics": {
-                    "rmse": rmse,
-                    "mae": mae,
-                    "r2": r2
-                },
-                # "features": features,
-                "hyperparameters": model_params
-            }
-            file.write(json.dumps(metrics) +','+ '\n')
+        store = get_metrics_store(metrics_store_path, metrics_history_path)
+        store.append(model_name, {"rmse": rmse, "mae": mae, "r2": r2}, model_params, run_id=run_id)
     except Exception as e:
-        logging.error(f"Unable to save metrics history to {metrics_history_path}. Error: {e}")
+        logging.error(f"Unable to save metrics to {metrics_store_path}. Error: {e}")
+        return None
 
-#Saving metrics
+    # metrics.json and params.json stay the files DVC tracks, now written from the store
     try:
-        """First, read existing data if the file already exists"""
-        if os.path.exists(metrics_file_path):
-            with open(metrics_file_path, "r") as file:
-                file_contents=file.read()
-                data = json.loads(file_contents) if file_contents else {}
-                
-        else:
-            data = {}
-
-        data[model_name] = {"metrics":
-                             {"rmse": rmse, "mae": mae,"r2": r2}}
-
-        with open(metrics_file_path, "w") as file:
-            json.dump(data, file, indent=4)
-
-    except Exception as e:
-        logging.error(f"Unable to save metrics to {metrics_file_path}. Error: {e}")
-    
-#Saving parameters
-    try:   
-        if os.path.exists(params_file_path):
-            with open(params_file_path, "r") as file:
-                file_contents=file.read()
-
-                params_data = json.loads(file_contents) if file_contents else {}
-        else:
-             params_data= {}
-                     
-        params_data[model_name] = {
-            "hyperparameters": model_params
-        }
-
-        with open(params_file_path, "w") as file:
-            json.dump(params_data, file, indent=4)
-
+        store.export(metrics_file_path, params_file_path, metrics_history_path)
     except Exception as e:
-        logging.error(f"Unable to save parameters to {params_file_path}. Error: {e}")
+        logging.error(f"Unable to export metrics to {metrics_file_path}, {params_file_path}. Error: {e}")
     
-    return None
\ No newline at end of file
+    return None
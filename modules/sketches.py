@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+
+def hash_values(values):
+    """64-bit hashes of an array of values (strings, numbers or mixed objects)."""
+    return pd.util.hash_array(np.asarray(values, dtype=object), categorize=False)
+
+
+class HyperLogLog:
+    """Approximate distinct count in 2**precision one-byte registers.
+
+    The standard error is about 1.04 / sqrt(2**precision) (0.8% at the
+    default 14). Up to `exact_limit` distinct values the hashes themselves
+    are kept as well, so small cardinalities are counted exactly. Sketches
+    with the same precision merge by register max.
+    """
+
+    def __init__(self, precision=14, exact_limit=10000):
+        self.precision = precision
+        self.exact_limit = exact_limit
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+        # Distinct hashes seen so far, dropped once there are more than exact_limit
+        self.exact = np.empty(0, dtype=np.uint64)
+
+    def add_hashes(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if not len(hashes):
+            return
+        if self.exact is not None:
+            self.exact = np.union1d(self.exact, hashes)
+            if len(self.exact) > self.exact_limit:
+                self.exact = None
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.intp)
+        # Rank = leading zeros of the remaining bits + 1; the top 53 bits are exact as float64
+        remaining = (hashes << p) >> np.uint64(11)
+        with np.errstate(divide='ignore'):
+            bit_length = np.where(remaining > 0, np.floor(np.log2(remaining.astype(np.float64))) + 1, 0)
+        rank = np.minimum(54 - bit_length, 64 - self.precision + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        if self.exact is not None and other.exact is not None:
+            self.exact = np.union1d(self.exact, other.exact)
+        if self.exact is None or other.exact is None or len(self.exact) > self.exact_limit:
+            self.exact = None
+
+    def count(self):
+        if self.exact is not None:
+            return len(self.exact)
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+
+class CountMinSketch:
+    """Approximate frequencies in a `depth` x `width` counter table.
+
+    Estimates never undercount; they overcount by at most about
+    total / width with probability 1 - 2**-depth, and much less in practice
+    thanks to conservative updates (a counter is only raised as far as the
+    value's new estimate needs). A small set of heavy hitter candidates is
+    tracked alongside, so the most frequent values can be reported without
+    keeping every distinct value.
+    """
+
+    def __init__(self, width=1 << 16, depth=4, top_k=16):
+        self.width = width
+        self.depth = depth
+        self.top_k = top_k
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.candidates = {}
+
+    def _indices(self, hashes):
+        # Double hashing: row i uses h1 + i * h2
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        h1 = hashes & np.uint64(0xFFFFFFFF)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        return [((h1 + np.uint64(i) * h2) % np.uint64(self.width)).astype(np.intp) for i in range(self.depth)]
+
+    def estimate_hashes(self, hashes):
+        indices = self._indices(hashes)
+        return np.min([self.table[i, index] for i, index in enumerate(indices)], axis=0)
+
+    def add(self, values, counts, hashes=None):
+        """Add already counted `values` (e.g. one batch's value counts) and refresh the heavy hitters."""
+        values = np.asarray(values, dtype=object)
+        counts = np.asarray(counts, dtype=np.int64)
+        if not len(values):
+            return
+        hashes = hash_values(values) if hashes is None else hashes
+        indices = self._indices(hashes)
+        targets = np.min([self.table[i, index] for i, index in enumerate(indices)], axis=0) + counts
+        for i, index in enumerate(indices):
+            np.maximum.at(self.table[i], index, targets)
+
+        # Only this batch's most frequent values can newly enter the top-k
+        top = np.argsort(counts)[::-1][:self.top_k]
+        pool = dict(self.candidates)
+        pool.update({values[i]: hashes[i] for i in top})
+        pool_values = list(pool)
+        estimates = self.estimate_hashes(np.array([pool[value] for value in pool_values], dtype=np.uint64))
+        keep = np.argsort(estimates)[::-1][:self.top_k]
+        self.candidates = {pool_values[i]: pool[pool_values[i]] for i in keep}
+
+    def most_common(self, n=1):
+        """The `n` heaviest candidates as (value, estimated count), most frequent first."""
+        if not self.candidates:
+            return []
+        values = list(self.candidates)
+        estimates = self.estimate_hashes(np.array([self.candidates[value] for value in values], dtype=np.uint64))
+        order = np.argsort(estimates, kind='stable')[::-1][:n]
+        return [(values[i], int(estimates[i])) for i in order]
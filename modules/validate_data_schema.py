@@ -1,17 +1,47 @@
 import os
+import re
 import json
-import numpy as np
+import time
+import argparse
 import logging
-from modules.data_loader import read_data
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor
 from modules.read_config import read_config
 from modules.logger_configurator import configure_logger
+from modules.build_schema import CATEGORICAL_DTYPES
+
 
 class ValidateDataSchema:
+    """Check remote parquet drops against `input_schema.json` before anything loads them.
+
+    Validation runs in two tiers. The structure tier reads only the file
+    footer: every schema field must be a column, and its dtype (as pandas
+    would read it, from the Arrow schema and pandas metadata) must match
+    the schema's `data_type`. It takes milliseconds whatever the file size.
+
+    With `check_values`, the value tier then checks that numeric fields lie
+    within the schema's `min_value`/`max_value`, and that categorical fields
+    listing `unique_values` hold only those values. Numeric ranges are
+    first decided from the row group statistics in the footer. Only columns
+    without statistics, and the categorical ones, are streamed in
+    `batch_size` row batches, with one vectorized Arrow kernel per column
+    and batch. Streaming stops at the first violation.
+
+    Every parquet file in the remote directory is validated, `workers`
+    files at a time.
+    """
+
     def __init__(self, config):
         self.config = config
-        self.schema_path = self.config['schema']
-        self.schema_file_path = os.path.join(self.schema_path, "input_schema.json")
-       
+        validation_config = self.config['data_validation']
+        self.data_path = self.config['data']['remote']
+        self.schema_file_path = validation_config['schema']
+        self.check_values = validation_config['check_values']
+        self.batch_size = validation_config['batch_size']
+        self.workers = validation_config['workers'] or os.cpu_count() or 1
+
     def _get_schema(self):
         try:
             with open(self.schema_file_path,'r') as file:
@@ -20,32 +50,159 @@ class ValidateDataSchema:
         except Exception as e:
             logging.error(f"Error reading schema: {e}")
             raise
-    
+
+    @staticmethod
+    def _dtypes_match(expected, actual):
+        # Strings read back as 'str' under pandas 3 and as 'object' before it
+        if expected in CATEGORICAL_DTYPES and actual in CATEGORICAL_DTYPES:
+            return expected != 'category' or actual == 'category'
+        # Likewise datetimes read back in microseconds rather than nanoseconds; only the timezone matters
+        datetime_unit = re.compile(r'\[(ns|us|ms|s)(?=[,\]])')
+        return datetime_unit.sub('[', expected) == datetime_unit.sub('[', actual)
+
+    def _check_structure(self, parquet_file, input_schema):
+        """Missing columns and dtype mismatches, from the footer alone."""
+        dtypes = parquet_file.schema_arrow.empty_table().to_pandas().dtypes
+        errors = []
+        for field, info in input_schema.items():
+            if field not in dtypes:
+                errors.append(f"{field} not in data")
+                continue
+            expected_dtype = info['data_type']
+            if not self._dtypes_match(expected_dtype, str(dtypes[field])):
+                errors.append(f"{field} has incorrect data type, expected: {expected_dtype}, but got: {dtypes[field]}")
+        return errors
+
+    @staticmethod
+    def _footer_range(metadata, position):
+        """Min/max of one column over all row groups, or None if any row group has no statistics."""
+        low, high = None, None
+        for row_group in range(metadata.num_row_groups):
+            statistics = metadata.row_group(row_group).column(position).statistics
+            if statistics is None or not statistics.has_min_max:
+                return None
+            low = statistics.min if low is None else min(low, statistics.min)
+            high = statistics.max if high is None else max(high, statistics.max)
+        return low, high
+
+    @staticmethod
+    def _range_error(field, info, low, high):
+        if low is not None and low < info['min_value']:
+            return f"{field} has values below {info['min_value']} (min {low})"
+        if high is not None and high > info['max_value']:
+            return f"{field} has values above {info['max_value']} (max {high})"
+        return None
+
+    def _check_values(self, parquet_file, input_schema):
+        """The first value outside the schema, or None; reads data pages only when the footer cannot tell."""
+        metadata = parquet_file.metadata
+        positions = {metadata.schema.column(i).name: i for i in range(metadata.num_columns)}
+
+        ranged, streamed_ranges = {}, []
+        for field, info in input_schema.items():
+            if info.get('min_value') is None or info.get('max_value') is None:
+                continue
+            ranged[field] = info
+            footer_range = self._footer_range(metadata, positions[field])
+            if footer_range is None:
+                streamed_ranges.append(field)
+                continue
+            error = self._range_error(field, info, *footer_range)
+            if error:
+                return error
+
+        allowed_values = {field: info['unique_values'] for field, info in input_schema.items()
+                          if info.get('unique_values') is not None}
+        columns = streamed_ranges + list(allowed_values)
+        if not columns:
+            return None
+
+        value_sets = {}
+        for field, values in allowed_values.items():
+            value_type = parquet_file.schema_arrow.field(field).type
+            if pa.types.is_dictionary(value_type):
+                value_type = value_type.value_type
+            value_sets[field] = pa.array(values, type=value_type)
+        for batch in parquet_file.iter_batches(batch_size=self.batch_size, columns=columns):
+            for field in streamed_ranges:
+                min_max = pc.min_max(batch.column(field)).as_py()
+                error = self._range_error(field, ranged[field], min_max['min'], min_max['max'])
+                if error:
+                    return error
+            for field, values in allowed_values.items():
+                column = batch.column(field)
+                # Nulls are not part of the value set and are left to the cleansing stage
+                unknown = pc.invert(pc.is_in(column, value_set=value_sets[field]))
+                if pc.any(unknown).as_py():
+                    value = column.filter(pc.fill_null(unknown, False))[0].as_py()
+                    return f"{field} has value {value!r} outside its {len(values)} known values"
+        return None
+
+    def validate_file(self, file_path, input_schema=None):
+        """Validation errors of one parquet file; an empty list means it passed."""
+        input_schema = self._get_schema() if input_schema is None else input_schema
+        start = time.perf_counter()
+        parquet_file = pq.ParquetFile(file_path)
+        errors = self._check_structure(parquet_file, input_schema)
+        if not errors and self.check_values:
+            error = self._check_values(parquet_file, input_schema)
+            if error:
+                errors.append(error)
+        for error in errors:
+            logging.error(f"'{file_path}': {error}")
+        tier = "structure and values" if self.check_values else "structure"
+        logging.info(f"Validated {tier} of '{file_path}' in {1e3 * (time.perf_counter() - start):.1f}ms")
+        return errors
+
+    def validate_files(self, file_paths):
+        """Validate files concurrently; returns each file's errors (unreadable files included)."""
+        input_schema = self._get_schema()
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {file_path: executor.submit(self.validate_file, file_path, input_schema) for file_path in file_paths}
+            for file_path, future in futures.items():
+                try:
+                    results[file_path] = future.result()
+                except Exception as e:
+                    logging.error(f"Error validating '{file_path}': {e}")
+                    results[file_path] = [str(e)]
+        return results
+
     def validate_data(self):
         try:
-            data, _ = read_data(self.config['data']['remote'])
-            input_schema = self._get_schema()
-            
-            for field in input_schema:
-                if field not in data.columns:
-                    logging.error(f'{field} not in remote data')
-                    return False
-            
-                expected_dtype = input_schema[field]['data_type']
-                if data[field].dtype != expected_dtype:
-                    logging.error(f"{field} has incorrect data type, expected: {expected_dtype}, but got: {data[field].dtype}")
-                    return False
-
-            logging.info("Data validation passed!")
+            if not os.path.exists(self.data_path):
+                logging.error(f"Directory {self.data_path} does not exist.")
+                return False
+            file_paths = sorted(os.path.join(self.data_path, file) for file in os.listdir(self.data_path)
+                                if file.endswith(".parquet"))
+            if not file_paths:
+                logging.error(f"No data file found in {self.data_path}.")
+                return False
+
+            results = self.validate_files(file_paths)
+            failed = [file_path for file_path, errors in results.items() if errors]
+            if failed:
+                logging.error(f"Data validation failed for {len(failed)} of {len(file_paths)} files")
+                return False
+
+            logging.info(f"Data validation passed for {len(file_paths)} files!")
             return True
-        
+
         except Exception as e:
             logging.error(f"Error during validation: {e}")
             return False
 
-# if __name__=='__main__':
-#     configure_logger()
-#     config = read_config('parameters.yaml')
-    
-#     Validation_instance = ValidateDataSchema(config)
-#     Validation_instance.validate_data()
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default="parameters.yaml", help="Path to the configuration file")
+    parser.add_argument("--values", action='store_true', help="Also check value ranges and categories")
+    args = parser.parse_args()
+
+    configure_logger()
+    config = read_config(args.config)
+    if args.values:
+        config['data_validation']['check_values'] = True
+
+    Validation_instance = ValidateDataSchema(config)
+    raise SystemExit(0 if Validation_instance.validate_data() else 1)
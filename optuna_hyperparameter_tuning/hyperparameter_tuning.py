@@ -1,9 +1,14 @@
+import time
 import yaml
 import optuna
 import logging
-from sklearn.model_selection import cross_val_score
+import numpy as np
+from optuna.trial import TrialState
+from sklearn.base import clone
+from sklearn.metrics import r2_score
 
 from modules.data_loader import read_data
+from modules.cv_split_cache import CVSplitCache
 from modules.read_config import read_config
 from modules.logger_configurator import configure_logger
 
@@ -13,8 +18,27 @@ from sklearn.linear_model import Ridge, Lasso
 from sklearn.tree import DecisionTreeRegressor
 
 
-def objective(trial, model_class, X,y,cv=5):
-    """Objective function for hyperparameter optimization."""
+def _fidelity_schedule(model, n_rungs):
+    """Return the estimator counts at which an ensemble is scored, or None.
+
+    Models that support `warm_start` grow their trees rung by rung, so the
+    intermediate scores cost no extra fitting.
+    """
+    params = model.get_params()
+    if 'n_estimators' not in params or 'warm_start' not in params or n_rungs <= 1:
+        return None
+    n_estimators = params['n_estimators']
+    rungs = np.linspace(n_estimators / n_rungs, n_estimators, n_rungs)
+    return sorted({max(1, int(round(r))) for r in rungs})
+
+
+def objective(trial, model_class, folds, n_rungs=4):
+    """Objective function for hyperparameter optimization.
+
+    Folds are scored one by one and the running mean R2 is reported to the
+    pruner after every fold (and after every estimator rung for ensembles),
+    so hopeless trials stop before all folds are fitted.
+    """
 
     # Defining Search Space,
     # log=True for search in logarithmic space and not linear space
@@ -54,29 +78,86 @@ def objective(trial, model_class, X,y,cv=5):
         raise ValueError("Invalid model_class provided.")
     
     model = globals()[model_class](**params)
+    schedule = _fidelity_schedule(model, n_rungs)
+    n_steps = len(schedule) if schedule else 1
+
+    fold_scores = []
+    for fold, (X_train, X_valid, y_train, y_valid) in enumerate(folds):
+        fold_model = clone(model)
+
+        for rung, n_estimators in enumerate(schedule or [None]):
+            if n_estimators is not None:
+                fold_model.set_params(warm_start=True, n_estimators=n_estimators)
+            fold_model.fit(X_train, y_train)
+            score = r2_score(y_valid, fold_model.predict(X_valid))
+
+            # Running mean over the finished folds plus the current one
+            trial.report((sum(fold_scores) + score) / (fold + 1), step=fold * n_steps + rung)
+            if trial.should_prune():
+                raise optuna.TrialPruned()
+
+        fold_scores.append(score)
+
+    return float(np.mean(fold_scores))
+
+
+def _get_pruner(tuning_config, model_class):
+    """Build the Optuna pruner named in the tuning configuration.
+
+    Hyperband's resource is the number of steps a trial reports: one per
+    fold, times the estimator rungs for models scored rung by rung.
+    """
+    pruner = tuning_config.get('pruner', 'median')
+    cv = tuning_config.get('cv', 5)
+    n_rungs = tuning_config.get('fidelity_rungs', 4)
 
-    return cross_val_score(model, X, y, cv=cv, scoring='r2').mean()
+    if pruner == 'median':
+        return optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=1)
+    elif pruner == 'hyperband':
+        schedule = _fidelity_schedule(globals()[model_class](), n_rungs)
+        return optuna.pruners.HyperbandPruner(min_resource=1, max_resource=cv * (n_rungs if schedule else 1))
+    elif pruner in (None, 'none'):
+        return optuna.pruners.NopPruner()
+    raise ValueError(f"Unknown pruner: {pruner}")
 
 
 
-def hyperparameter_tuning(model_class, X, y, n_trials=100):
+def hyperparameter_tuning(model_class, folds, tuning_config):
     """Hyperparameter tuning using Optuna's Tree-structured Parzen Estimator (TPE)
+    with fold-level pruning.
     Returns:
-    - A dictionary containing the best hyperparameters.
+    - A dictionary containing the best hyperparameters, or None when no trial completed.
     """
+    n_trials = tuning_config.get('n_trials', 100)
+    n_rungs = tuning_config.get('fidelity_rungs', 4)
 
     # Define study object
     sampler = optuna.samplers.TPESampler()
     study_name = "STUDY_" + model_class
 
     study = optuna.create_study(direction="maximize",
-                                storage="sqlite:///optuna_hyperparameter_tuning/optuna_db.sqlite3",  
+                                storage=tuning_config['storage'],
                                 study_name=study_name,
                                 sampler=sampler,
+                                pruner=_get_pruner(tuning_config, model_class),
                                 load_if_exists=True)  
 
     # Optimize the study with the objective function.
-    study.optimize(lambda trial: objective(trial, model_class, X, y), n_trials=n_trials)
+    start = time.perf_counter()
+    n_existing = len(study.trials)
+    study.optimize(lambda trial: objective(trial, model_class, folds, n_rungs=n_rungs), n_trials=n_trials)
+    elapsed = time.perf_counter() - start
+
+    new_trials = study.get_trials(deepcopy=False)[n_existing:]
+    n_pruned = sum(t.state == TrialState.PRUNED for t in new_trials)
+    n_complete = sum(t.state == TrialState.COMPLETE for t in new_trials)
+    # best_value raises when no trial of the study ever completed
+    completed = study.get_trials(deepcopy=False, states=(TrialState.COMPLETE,))
+    best = f"best R2 {study.best_value:.4f}" if completed else "no completed trial"
+    logging.info(f"{study_name}: {n_complete} completed, {n_pruned} pruned trials in {elapsed:.1f}s, {best}")
+    if not completed:
+        logging.warning(f"{study_name}: every trial was pruned or failed, keeping the current parameters")
+        return None
 
     return study.best_params
 
@@ -112,10 +193,16 @@ def main():
     y, filename = read_data(config['data']['transformed']['y'])
     y=y.squeeze() 
 
+    # Folds are built once and shared by every model's study
+    tuning_config = config['hyperparameter_tuning']
+    split_cache = CVSplitCache(tuning_config['cache_dir'], cv=tuning_config.get('cv', 5))
+    folds = split_cache.get_folds(X, y)
 
     for model_name in model_class:
-        best_params=hyperparameter_tuning(model_name, X, y)
+        best_params=hyperparameter_tuning(model_name, folds, tuning_config)
         print(best_params)
+        if best_params is None:
+            continue
         update_yaml_params(model_name,best_params,yaml_path)
 
 
@@ -0,0 +1,103 @@
+import time
+import asyncio
+import collections
+
+from prediction_app.metrics import Counter, Gauge
+
+ADMISSION_REJECTED = Counter('nyc_taxi_admission_rejected_total',
+                             'Requests refused before model work, by reason (overloaded or deadline).', ['reason'])
+ADMISSION_IN_FLIGHT = Gauge('nyc_taxi_admission_in_flight', 'Requests holding an admission slot.')
+ADMISSION_QUEUED = Gauge('nyc_taxi_admission_queued', 'Requests waiting for an admission slot.')
+
+
+class Overloaded(Exception):
+    """No slot is free and the wait queue is full (or the wait timed out)."""
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before its model work started."""
+
+
+def check_deadline(deadline):
+    if deadline is not None and time.perf_counter() >= deadline:
+        ADMISSION_REJECTED.labels(reason='deadline').inc()
+        raise DeadlineExceeded("Request deadline passed before scoring started")
+
+
+class AdmissionController:
+    """Bound the requests doing model work at once and shed the excess early.
+
+    At most `max_in_flight` requests hold a slot; up to `max_queue` more
+    wait for one in arrival order, for at most `max_queue_wait` seconds or
+    until their deadline. Anything beyond that is refused right away with
+    Overloaded, so under overload latency stays bounded for the admitted
+    requests instead of growing for all of them. Used from one event loop.
+    """
+
+    def __init__(self, max_in_flight=64, max_queue=256, max_queue_wait=0.1):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_queue_wait = max_queue_wait
+        self.in_flight = 0
+        self._waiters = collections.deque()
+        self._in_flight_gauge = ADMISSION_IN_FLIGHT.labels()
+        self._queued_gauge = ADMISSION_QUEUED.labels()
+
+    def _update_gauges(self):
+        self._in_flight_gauge.set(self.in_flight)
+        self._queued_gauge.set(len(self._waiters))
+
+    async def acquire(self, deadline=None):
+        check_deadline(deadline)
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self._update_gauges()
+            return
+        if len(self._waiters) >= self.max_queue:
+            ADMISSION_REJECTED.labels(reason='overloaded').inc()
+            raise Overloaded(f"{self.in_flight} requests in flight and {len(self._waiters)} queued")
+
+        timeout = self.max_queue_wait
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.perf_counter())
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._update_gauges()
+        try:
+            # `release` hands its slot over by resolving the future
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # The slot arrived just as the wait timed out
+                return
+            waiter.cancel()
+            check_deadline(deadline)
+            ADMISSION_REJECTED.labels(reason='overloaded').inc()
+            raise Overloaded(f"No slot freed within {timeout * 1e3:.0f}ms")
+        except asyncio.CancelledError:
+            # Client went away; don't leak a slot that was already handed over
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            self._update_gauges()
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._update_gauges()
+                return
+        self.in_flight -= 1
+        self._update_gauges()
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue
+        }
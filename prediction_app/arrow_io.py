@@ -0,0 +1,61 @@
+import numpy as np
+import pyarrow as pa
+
+
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+
+
+def read_arrow_table(body):
+    """Read an Arrow IPC stream; the table's buffers point into `body` without copying."""
+    try:
+        return pa.ipc.open_stream(pa.py_buffer(body)).read_all()
+    except (pa.ArrowInvalid, OSError) as e:
+        raise ValueError(f"Invalid Arrow IPC stream: {e}")
+
+
+def arrow_feature_columns(table, numeric_fields, categorical_fields):
+    """Check the table's feature columns and convert them for `FeatureMapper.map_columns`.
+
+    Numeric columns become NumPy views where Arrow allows it (single chunk,
+    no nulls) and string columns are dictionary encoded, so each distinct
+    category is looked up once. Raises ValueError listing every problem.
+    """
+    columns, errors = {}, []
+    for field in list(numeric_fields) + list(categorical_fields):
+        if field not in table.column_names:
+            errors.append(f"'{field}': column missing")
+            continue
+        column = table.column(field)
+        if column.null_count:
+            errors.append(f"'{field}': {column.null_count} null values")
+            continue
+
+        if field in numeric_fields:
+            if not (pa.types.is_integer(column.type) or pa.types.is_floating(column.type)):
+                errors.append(f"'{field}': expected a numeric column, got {column.type}")
+                continue
+            columns[field] = column.to_numpy()
+        else:
+            if pa.types.is_dictionary(column.type):
+                value_type = column.type.value_type
+            else:
+                value_type = column.type
+            if not (pa.types.is_string(value_type) or pa.types.is_large_string(value_type)):
+                errors.append(f"'{field}': expected a string column, got {column.type}")
+                continue
+            if not pa.types.is_dictionary(column.type):
+                column = column.dictionary_encode()
+            columns[field] = column.to_pandas()
+
+    if errors:
+        raise ValueError("; ".join(errors))
+    return columns
+
+
+def write_arrow_predictions(predictions):
+    """Serialize an (n, 1) prediction array as an Arrow IPC stream with a `prediction` column."""
+    table = pa.table({'prediction': np.ascontiguousarray(predictions[:, 0])})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
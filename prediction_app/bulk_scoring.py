@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import shutil
+import logging
+import argparse
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from modules.read_config import read_config
+from modules.logger_configurator import configure_logger
+from prediction_app.model_bundle import ModelBundle
+
+# run >> python -m prediction_app.bulk_scoring --input data/feature_engineered/<file>.parquet --output <predictions>.parquet
+
+# Set in each worker process by `_init_worker`
+_bundle = None
+
+
+def _init_worker(bundle_dir, verify_checksums):
+    global _bundle
+    # The compiled model is memory-mapped, so all workers share one copy of it
+    _bundle = ModelBundle.load(bundle_dir, verify_checksums=verify_checksums, mmap_model=True)
+
+
+def _score_row_group(input_path, row_group, part_path, batch_size, keep_columns):
+    """Score one input row group in record batches and write it as one part file."""
+    parquet_file = pq.ParquetFile(input_path)
+    mapper = _bundle.feature_mapper
+    names = set(parquet_file.schema_arrow.names)
+    missing = [name for name in mapper.numeric_fields + mapper.onehot_fields if name not in names]
+    if missing:
+        # map_columns would score the rows with zeros in place of the missing features
+        raise ValueError(f"'{input_path}' is missing feature columns: {', '.join(missing)}")
+    fields = [name for name in parquet_file.schema_arrow.names
+              if name in mapper.numeric_fields or name in mapper.onehot_fields]
+
+    predictions, kept = [], []
+    features = None
+    for batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=[row_group],
+                                           columns=fields + keep_columns):
+        n_rows = batch.num_rows
+        if features is None or len(features) < n_rows:
+            features = np.empty((n_rows, len(mapper.feature_columns)), dtype=mapper.dtype)
+        columns = {name: batch.column(name).to_pandas() for name in fields}
+        X = mapper.map_columns(columns, n_rows, out=features[:n_rows])
+        predictions.append(_bundle.predict_matrix(X)[:, 0])
+        if keep_columns:
+            kept.append(batch.select(keep_columns))
+
+    prediction = np.concatenate(predictions) if predictions else np.empty(0, dtype=np.float64)
+    table = pa.table({'prediction': prediction})
+    if keep_columns:
+        kept_schema = pa.schema([parquet_file.schema_arrow.field(name) for name in keep_columns])
+        kept_table = pa.Table.from_batches(kept, schema=kept_schema)
+        for name in keep_columns:
+            table = table.append_column(name, kept_table.column(name))
+
+    tmp_path = part_path + '.tmp'
+    pq.write_table(table, tmp_path, row_group_size=max(len(prediction), 1))
+    os.replace(tmp_path, part_path)
+    return row_group, len(prediction)
+
+
+class BulkScorer:
+    """Score a feature parquet offline with the serving bundle.
+
+    Each input row group is scored by a worker process, streamed in record
+    batches of `batch_size` rows through the same FeatureMapper and
+    ModelBundle the API uses, and written to its own part file. Output row
+    group i holds exactly the predictions for input row group i, in order.
+
+    Finished parts are kept in `<output>.parts` until the run completes, so
+    an interrupted run resumes where it stopped. Parts are discarded when
+    the input file or the model version changed since they were written.
+    """
+
+    def __init__(self, bundle_dir, workers=0, batch_size=65536, verify_checksums=True):
+        self.bundle_dir = os.path.realpath(bundle_dir)
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.verify_checksums = verify_checksums
+        with open(os.path.join(self.bundle_dir, 'manifest.json'), 'r') as file:
+            self.model_version = json.load(file)['version']
+
+    @staticmethod
+    def _part_path(parts_dir, row_group):
+        return os.path.join(parts_dir, f"part-{row_group:05d}.parquet")
+
+    def _prepare_parts(self, input_path, parts_dir, parquet_file):
+        """Return the row groups already scored by a compatible earlier run."""
+        stat = os.stat(input_path)
+        progress = {
+            'input': os.path.realpath(input_path),
+            'input_size': stat.st_size,
+            'input_mtime': stat.st_mtime,
+            'num_rows': parquet_file.metadata.num_rows,
+            'model_version': self.model_version
+        }
+        progress_path = os.path.join(parts_dir, 'progress.json')
+        if os.path.exists(progress_path):
+            with open(progress_path, 'r') as file:
+                previous = json.load(file)
+            if previous != progress:
+                logging.warning(f"Input or model changed since '{parts_dir}' was written, starting over")
+                shutil.rmtree(parts_dir)
+
+        os.makedirs(parts_dir, exist_ok=True)
+        with open(progress_path, 'w') as file:
+            json.dump(progress, file, indent=4)
+
+        done = set()
+        for row_group in range(parquet_file.num_row_groups):
+            part_path = self._part_path(parts_dir, row_group)
+            if os.path.exists(part_path) and \
+                    pq.ParquetFile(part_path).metadata.num_rows == parquet_file.metadata.row_group(row_group).num_rows:
+                done.add(row_group)
+        return done
+
+    def _merge_parts(self, parts_dir, output_path, num_row_groups):
+        tmp_path = output_path + '.tmp'
+        writer = None
+        for row_group in range(num_row_groups):
+            table = pq.read_table(self._part_path(parts_dir, row_group))
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table, row_group_size=max(table.num_rows, 1))
+        if writer is not None:
+            writer.close()
+            os.replace(tmp_path, output_path)
+        shutil.rmtree(parts_dir)
+
+    def score(self, input_path, output_path, keep_columns=None):
+        """Write predictions for `input_path` to `output_path` and return rows/sec."""
+        keep_columns = list(keep_columns or [])
+        parquet_file = pq.ParquetFile(input_path)
+        num_row_groups = parquet_file.num_row_groups
+        total_rows = parquet_file.metadata.num_rows
+
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        parts_dir = output_path + '.parts'
+        done = self._prepare_parts(input_path, parts_dir, parquet_file)
+        pending = [row_group for row_group in range(num_row_groups) if row_group not in done]
+        if done:
+            logging.info(f"Resuming: {len(done)} of {num_row_groups} row groups already scored")
+
+        start = time.perf_counter()
+        scored_rows = 0
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.bundle_dir, self.verify_checksums)) as pool:
+            # Keep a bounded number of row groups in flight so memory stays flat
+            in_flight = set()
+            while pending or in_flight:
+                while pending and len(in_flight) < 2 * self.workers:
+                    row_group = pending.pop(0)
+                    in_flight.add(pool.submit(_score_row_group, input_path, row_group,
+                                              self._part_path(parts_dir, row_group), self.batch_size, keep_columns))
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    row_group, n_rows = future.result()
+                    done.add(row_group)
+                    scored_rows += n_rows
+                    elapsed = time.perf_counter() - start
+                    logging.info(f"Row group {row_group + 1}/{num_row_groups} scored "
+                                 f"({len(done)}/{num_row_groups} done, {scored_rows / elapsed:,.0f} rows/sec)")
+
+        self._merge_parts(parts_dir, output_path, num_row_groups)
+        elapsed = time.perf_counter() - start
+        rows_per_sec = scored_rows / elapsed if elapsed > 0 else 0.0
+        logging.info(f"Scored {scored_rows:,} of {total_rows:,} rows with model '{self.model_version}' "
+                     f"in {elapsed:.1f}s ({rows_per_sec:,.0f} rows/sec), written to '{output_path}'")
+        return rows_per_sec
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default="parameters.yaml", help="Path to the configuration file")
+    parser.add_argument("--input", required=True, help="Feature parquet to score")
+    parser.add_argument("--output", required=True, help="Predictions parquet to write")
+    parser.add_argument("--keep-columns", nargs='*', default=[], help="Input columns to copy next to the predictions")
+    parser.add_argument("--workers", type=int, help="Worker processes, 0 for one per CPU")
+    parser.add_argument("--batch-size", type=int, help="Rows per record batch")
+    args = parser.parse_args()
+
+    configure_logger(args.config)
+    app_config = read_config(args.config)['prediction_app']
+    scoring_config = app_config['bulk_scoring']
+    scorer = BulkScorer(os.path.join(app_config['deployments'], 'current'),
+                        workers=args.workers if args.workers is not None else scoring_config['workers'],
+                        batch_size=args.batch_size or scoring_config['batch_size'],
+                        verify_checksums=app_config['verify_checksums'])
+    scorer.score(args.input, args.output, keep_columns=args.keep_columns)
@@ -0,0 +1,206 @@
+import os
+import time
+import struct
+import pickle
+import zipfile
+import logging
+import argparse
+import warnings
+import numpy as np
+from sklearn.dummy import DummyRegressor
+from sklearn.tree import DecisionTreeRegressor
+from sklearn.ensemble import GradientBoostingRegressor
+
+
+def _mmap_npz(file_path, names):
+    """Memory-map members of an uncompressed .npz archive without reading them."""
+    arrays = {}
+    with zipfile.ZipFile(file_path) as archive, open(file_path, 'rb') as file:
+        for name in names:
+            info = archive.getinfo(name + '.npy')
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"'{name}' is compressed and can't be memory-mapped")
+            # Member data follows the 30-byte local header, file name and extra field
+            file.seek(info.header_offset)
+            name_length, extra_length = struct.unpack('<HH', file.read(30)[26:30])
+            file.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(file)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(file)
+            arrays[name] = np.memmap(file_path, dtype=dtype, mode='r', offset=file.tell(),
+                                     shape=shape, order='F' if fortran_order else 'C')
+    return arrays
+
+
+class CompiledTreeEnsemble:
+    """Tree ensemble flattened into contiguous NumPy node arrays.
+
+    All trees share one set of node arrays (feature, threshold, children,
+    value); leaves point to themselves so every row can be walked
+    `max_depth` steps through all trees at once without branching.
+    Predictions are bit-identical to the sklearn model they were built from.
+    """
+
+    NODE_ARRAYS = ['feature', 'threshold', 'children', 'missing_left', 'value', 'roots']
+
+    def __init__(self, feature, threshold, children, missing_left, value,
+                 roots, scale, baseline, max_depth, feature_names):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.missing_left = missing_left
+        self.value = value
+        self.roots = roots
+        self.scale = float(scale)
+        self.baseline = float(baseline)
+        self.max_depth = int(max_depth)
+        self.feature_names = list(feature_names)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Build from a fitted DecisionTreeRegressor or GradientBoostingRegressor."""
+        if isinstance(model, DecisionTreeRegressor):
+            trees, scale, baseline = [model.tree_], 1.0, 0.0
+        elif isinstance(model, GradientBoostingRegressor):
+            if not (model.init_ == 'zero' or isinstance(model.init_, DummyRegressor)):
+                raise ValueError("Only constant init estimators can be compiled.")
+            trees = [estimator.tree_ for estimator in model.estimators_[:, 0]]
+            scale = model.learning_rate
+            # Constant raw prediction of the init estimator, exactly as sklearn computes it
+            dummy_row = np.zeros((1, model.n_features_in_), dtype=np.float32)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                baseline = model._raw_predict_init(dummy_row)[0, 0]
+        else:
+            raise ValueError(f"Unsupported model type: {type(model).__name__}")
+
+        # sklearn's boosting predictor sends NaN right; single trees honour missing_go_to_left
+        honour_missing = isinstance(model, DecisionTreeRegressor)
+
+        feature, threshold, children, missing_left, value, roots = [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            n_nodes = tree.node_count
+            node_ids = np.arange(n_nodes)
+            is_leaf = tree.children_left == -1
+
+            # Leaves become self-loops so extra traversal steps are no-ops
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+            children.append(np.stack([np.where(is_leaf, node_ids, tree.children_left),
+                                      np.where(is_leaf, node_ids, tree.children_right)], axis=1) + offset)
+            missing = getattr(tree, 'missing_go_to_left', None)
+            if missing is None or not honour_missing:
+                missing = np.zeros(n_nodes, dtype=bool)
+            missing_left.append(np.asarray(missing, dtype=bool))
+            value.append(tree.value[:, 0, 0])
+            roots.append(offset)
+            offset += n_nodes
+
+        feature_names = getattr(model, 'feature_names_in_', range(model.n_features_in_))
+        return cls(feature=np.ascontiguousarray(np.concatenate(feature), dtype=np.int32),
+                   threshold=np.ascontiguousarray(np.concatenate(threshold), dtype=np.float64),
+                   children=np.ascontiguousarray(np.concatenate(children).ravel(), dtype=np.int32),
+                   missing_left=np.ascontiguousarray(np.concatenate(missing_left)),
+                   value=np.ascontiguousarray(np.concatenate(value), dtype=np.float64),
+                   roots=np.asarray(roots, dtype=np.int32),
+                   scale=scale,
+                   baseline=baseline,
+                   max_depth=max(tree.max_depth for tree in trees),
+                   feature_names=[str(name) for name in feature_names])
+
+    def save(self, file_path):
+        """Save the node arrays as an uncompressed .npz archive."""
+        np.savez(file_path,
+                 feature=self.feature, threshold=self.threshold, children=self.children,
+                 missing_left=self.missing_left, value=self.value, roots=self.roots,
+                 scale=self.scale, baseline=self.baseline, max_depth=self.max_depth,
+                 feature_names=np.asarray(self.feature_names))
+
+    @classmethod
+    def load(cls, file_path, mmap=False):
+        """Load an archive written by `save`.
+
+        With `mmap` the node arrays are memory-mapped read-only straight out
+        of the archive instead of copied to the heap, so every process that
+        maps the same file shares one copy of them through the page cache.
+        """
+        with np.load(file_path) as arrays:
+            if mmap:
+                node_arrays = _mmap_npz(file_path, cls.NODE_ARRAYS)
+            else:
+                node_arrays = {name: arrays[name] for name in cls.NODE_ARRAYS}
+            return cls(scale=arrays['scale'], baseline=arrays['baseline'], max_depth=arrays['max_depth'],
+                       feature_names=arrays['feature_names'].tolist(), **node_arrays)
+
+    def _predict_chunk(self, X, has_missing):
+        n_rows, n_features = X.shape
+        X_flat = X.ravel()
+        row_offsets = (np.arange(n_rows, dtype=np.int32) * n_features)[:, None]
+        node = np.broadcast_to(self.roots, (n_rows, len(self.roots))).copy()
+
+        for _ in range(self.max_depth):
+            x = X_flat[row_offsets + self.feature[node]]
+            if has_missing:
+                go_right = ~(x <= self.threshold[node]) & ~(np.isnan(x) & self.missing_left[node])
+            else:
+                go_right = x > self.threshold[node]
+            node = self.children[2 * node + go_right]
+
+        # Accumulate tree by tree with a sequential cumsum, matching sklearn's
+        # summation order so the result is bit-identical.
+        contributions = np.empty((n_rows, len(self.roots) + 1), dtype=np.float64)
+        contributions[:, 0] = self.baseline
+        contributions[:, 1:] = self.scale * self.value[node]
+        return np.cumsum(contributions, axis=1)[:, -1]
+
+    def predict(self, X, chunk_size=4096):
+        """Predict a 2D batch; X is cast to float32 like sklearn does."""
+        if hasattr(X, 'columns') and set(self.feature_names).issubset(map(str, X.columns)):
+            X = X[self.feature_names]
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != len(self.feature_names):
+            raise ValueError(f"Expected input of shape (n, {len(self.feature_names)}), got {X.shape}")
+        has_missing = bool(np.isnan(X).any())
+
+        predictions = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], chunk_size):
+            stop = start + chunk_size
+            predictions[start:stop] = self._predict_chunk(X[start:stop], has_missing)
+        return predictions
+
+
+def benchmark(model_path, compiled_path, batch_sizes=(1, 10, 100, 1000, 10000, 100000), repeats=5):
+    """Compare sklearn and compiled prediction latency on random batches."""
+    with open(model_path, 'rb') as file:
+        model = pickle.load(file)
+    compiled = CompiledTreeEnsemble.load(compiled_path)
+    rng = np.random.default_rng(0)
+
+    results = []
+    for batch_size in batch_sizes:
+        X = rng.normal(size=(batch_size, len(compiled.feature_names))).astype(np.float32)
+        if not np.array_equal(model.predict(X), compiled.predict(X)):
+            raise AssertionError(f"Compiled predictions differ from sklearn at batch size {batch_size}")
+
+        timings = {}
+        for name, predict in (('sklearn', model.predict), ('compiled', compiled.predict)):
+            start = time.perf_counter()
+            for _ in range(repeats):
+                predict(X)
+            timings[name] = (time.perf_counter() - start) / repeats
+
+        results.append({'batch_size': batch_size, **timings, 'speedup': timings['sklearn'] / timings['compiled']})
+        logging.info(f"batch={batch_size:>6}: sklearn {timings['sklearn'] * 1e3:.3f} ms, "
+                     f"compiled {timings['compiled'] * 1e3:.3f} ms, "
+                     f"speedup x{results[-1]['speedup']:.1f}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the compiled serving model against sklearn")
+    parser.add_argument("--model-dir", default="prediction_app/prediction_resources/serving_models")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(asctime)s: %(message)s')
+    benchmark(os.path.join(args.model_dir, 'model.pkl'), os.path.join(args.model_dir, 'compiled_model.npz'))
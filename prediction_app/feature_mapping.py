@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+from itertools import chain
+from operator import itemgetter
+
+
+# Feature layout produced by S04 (scaled continuous columns, hours, one-hot days)
+keys_list = [
+    'trip_miles', 'trip_time', 'duration_minutes', 'wait_time_minutes', 'service_time_minutes', 'average_speed',
+    'request_datetime_hour', 'on_scene_datetime_hour', 'pickup_datetime_hour', 'dropoff_datetime_hour',
+    'request_datetime_day_Friday', 'request_datetime_day_Monday',
+    'request_datetime_day_Saturday', 'request_datetime_day_Sunday', 'request_datetime_day_Thursday',
+    'request_datetime_day_Tuesday', 'request_datetime_day_Wednesday', 'on_scene_datetime_day_Friday',
+    'on_scene_datetime_day_Monday', 'on_scene_datetime_day_Saturday', 'on_scene_datetime_day_Sunday',
+    'on_scene_datetime_day_Thursday', 'on_scene_datetime_day_Tuesday', 'on_scene_datetime_day_Wednesday',
+    'pickup_datetime_day_Friday', 'pickup_datetime_day_Monday', 'pickup_datetime_day_Saturday',
+    'pickup_datetime_day_Sunday', 'pickup_datetime_day_Thursday', 'pickup_datetime_day_Tuesday',
+    'pickup_datetime_day_Wednesday', 'dropoff_datetime_day_Friday', 'dropoff_datetime_day_Monday',
+    'dropoff_datetime_day_Saturday', 'dropoff_datetime_day_Sunday', 'dropoff_datetime_day_Thursday',
+    'dropoff_datetime_day_Tuesday', 'dropoff_datetime_day_Wednesday'
+]
+
+continuous_cols = [
+    'trip_miles', 'trip_time', 'duration_minutes',
+    'wait_time_minutes', 'service_time_minutes', 'average_speed'
+]
+
+days_columns = [
+    'request_datetime_day', 'on_scene_datetime_day',
+    'pickup_datetime_day', 'dropoff_datetime_day'
+]
+
+
+class _ColumnLookup(dict):
+    """Category value -> column index; unknown values map to -1."""
+
+    def __missing__(self, key):
+        # Match the f-string formatting the DataFrame mapping used for non-str values
+        return self.get(str(key), -1) if not isinstance(key, str) else -1
+
+
+class FeatureMapper:
+    """Map request dicts straight into a model-ready feature matrix.
+
+    The column-index table is built once from the fitted feature layout:
+    numeric fields are copied into their column and each one-hot field
+    sets a single column chosen by a value -> index lookup. The output is
+    value-for-value identical to the DataFrame `map_data_to_df` builds.
+
+    The default dtype is float64 so continuous fields are scaled at full
+    precision, exactly as before; the model casts to float32 afterwards.
+    """
+
+    def __init__(self, feature_columns=None, onehot_fields=None, dtype=np.float64):
+        self.feature_columns = list(feature_columns if feature_columns is not None else keys_list)
+        self.dtype = dtype
+        column_index = {column: i for i, column in enumerate(self.feature_columns)}
+
+        self.onehot_fields = [field for field in (onehot_fields or days_columns)
+                              if any(column.startswith(field + '_') for column in self.feature_columns)]
+        onehot_columns = {column for field in self.onehot_fields
+                          for column in self.feature_columns if column.startswith(field + '_')}
+        self.numeric_fields = [column for column in self.feature_columns if column not in onehot_columns]
+
+        self.numeric_index = np.array([column_index[field] for field in self.numeric_fields], dtype=np.intp)
+        self.onehot_lookup = {
+            field: _ColumnLookup({column[len(field) + 1:]: column_index[column]
+                                  for column in self.feature_columns if column.startswith(field + '_')})
+            for field in self.onehot_fields
+        }
+        self.continuous_index = np.array([column_index[column] for column in continuous_cols
+                                          if column in column_index], dtype=np.intp)
+
+        # itemgetter pulls all listed fields of a record in one C call
+        self._numeric_getter = self._tuple_getter(self.numeric_fields)
+        self._onehot_getter = self._tuple_getter(self.onehot_fields)
+
+    @staticmethod
+    def _tuple_getter(fields):
+        if not fields:
+            return None
+        if len(fields) == 1:
+            field = fields[0]
+            return lambda record: (record[field],)
+        return itemgetter(*fields)
+
+    @staticmethod
+    def _field_rows(records, getter, fields, default):
+        """Per-record field tuples, with a slow path when some record lacks a field."""
+        try:
+            return list(map(getter, records))
+        except KeyError:
+            return [tuple(record.get(field, default) for field in fields) for record in records]
+
+    def map_records(self, records, out=None):
+        """Fill an (n, n_features) matrix from a list of request dicts.
+
+        `out` may be a preallocated array of the right shape to reuse.
+        """
+        n_rows = len(records)
+        if out is None:
+            out = np.zeros((n_rows, len(self.feature_columns)), dtype=self.dtype)
+        else:
+            out[:] = 0
+        if not n_rows:
+            return out
+
+        if self._numeric_getter is not None:
+            n_fields = len(self.numeric_fields)
+            rows = self._field_rows(records, self._numeric_getter, self.numeric_fields, 0)
+            values = np.fromiter(chain.from_iterable(rows), dtype=self.dtype, count=n_rows * n_fields)
+            out[:, self.numeric_index] = values.reshape(n_rows, n_fields)
+
+        if self._onehot_getter is not None:
+            rows = self._field_rows(records, self._onehot_getter, self.onehot_fields, None)
+            row_index = np.arange(n_rows)
+            for field, values in zip(self.onehot_fields, zip(*rows)):
+                columns = np.fromiter(map(self.onehot_lookup[field].__getitem__, values),
+                                      dtype=np.intp, count=n_rows)
+                known = columns >= 0
+                out[row_index[known], columns[known]] = 1
+        return out
+
+    def map_record(self, record):
+        """Map a single request dict into a (1, n_features) row."""
+        return self.map_records([record])
+
+    def _onehot_columns(self, field, values):
+        """Column index per row for one categorical field, looking up each distinct value once."""
+        values = pd.Series(values, copy=False)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            categories, codes = values.cat.categories, values.cat.codes.to_numpy()
+        else:
+            codes, categories = pd.factorize(values)
+        lookup = self.onehot_lookup[field]
+        # One extra slot so code -1 (null) indexes the "unknown" column
+        category_columns = np.fromiter((lookup[value] for value in categories), dtype=np.intp,
+                                       count=len(categories))
+        return np.append(category_columns, -1)[codes]
+
+    def map_columns(self, columns, n_rows, out=None):
+        """Fill an (n, n_features) matrix from column arrays, e.g. a parquet batch.
+
+        `columns` maps field names to equal-length arrays or Series. Absent
+        numeric fields are 0 and absent categorical fields set no column, as
+        in `map_records`; null numeric values are kept as NaN.
+        """
+        if out is None:
+            out = np.zeros((n_rows, len(self.feature_columns)), dtype=self.dtype)
+        else:
+            out[:] = 0
+        if not n_rows:
+            return out
+
+        for field, index in zip(self.numeric_fields, self.numeric_index):
+            if field in columns:
+                out[:, index] = pd.Series(columns[field], copy=False).to_numpy(dtype=self.dtype, na_value=np.nan)
+
+        row_index = np.arange(n_rows)
+        for field in self.onehot_fields:
+            if field in columns:
+                column_index = self._onehot_columns(field, columns[field])
+                known = column_index >= 0
+                out[row_index[known], column_index[known]] = 1
+        return out
@@ -0,0 +1,254 @@
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import importlib
+import numpy as np
+import httpx
+
+from modules.read_config import read_config
+from modules.logger_configurator import configure_logger
+from prediction_app.request_validator import WEEKDAYS, MONTHS
+
+# run >> python -m prediction_app.load_test                      (in-process against fastapp:app)
+# run >> python -m prediction_app.load_test --url http://localhost:8000
+
+
+def load_payloads(payload_path):
+    """Read recorded trips, one JSON object per line."""
+    with open(payload_path, 'r') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def synthesize_payloads(schema_path, fields, n_payloads=1000, seed=0):
+    """Random trips within the ranges of a feature schema built by SchemaBuilder.
+
+    `fields` maps request field names to their type (float, int or str).
+    Numeric fields are drawn uniformly between the schema's min and max,
+    day and month fields from the calendar names, and other strings are
+    the schema's most frequent value.
+    """
+    with open(schema_path, 'r') as file:
+        schema = json.load(file)
+    rng = random.Random(seed)
+
+    def draw(field, field_type):
+        info = schema.get(field, {})
+        if field_type is str:
+            if field.endswith('_day'):
+                return rng.choice(WEEKDAYS)
+            if field.endswith('_month'):
+                return rng.choice(MONTHS)
+            return info.get('most_frequent_value', '')
+        low, high = info.get('min_value', 0.0), info.get('max_value', 1.0)
+        return rng.randint(int(low), int(high)) if field_type is int else rng.uniform(low, high)
+
+    return [{field: draw(field, field_type) for field, field_type in fields.items()} for _ in range(n_payloads)]
+
+
+def summarize(name, scenario, latencies, statuses, elapsed, rows_per_request):
+    """Throughput and latency percentiles (ms) of one scenario run."""
+    latencies = np.asarray(latencies) * 1e3
+    n_requests = len(statuses)
+    n_ok = sum(1 for status in statuses if status == 200)
+    status_counts = {}
+    for status in statuses:
+        status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+    return {
+        'name': name,
+        'scenario': scenario,
+        'requests': n_requests,
+        'errors': n_requests - n_ok,
+        'error_rate': (n_requests - n_ok) / n_requests if n_requests else 0.0,
+        'status_counts': status_counts,
+        'duration_s': elapsed,
+        'requests_per_sec': n_requests / elapsed if elapsed else 0.0,
+        'rows_per_sec': n_ok * rows_per_request / elapsed if elapsed else 0.0,
+        'latency_ms': {
+            'p50': float(np.percentile(latencies, 50)) if n_requests else None,
+            'p95': float(np.percentile(latencies, 95)) if n_requests else None,
+            'p99': float(np.percentile(latencies, 99)) if n_requests else None,
+            'max': float(latencies.max()) if n_requests else None,
+            'mean': float(latencies.mean()) if n_requests else None
+        }
+    }
+
+
+class LoadTester:
+    """Drive `/predict` and the batch routes and measure the latency distribution.
+
+    Closed-loop scenarios keep `concurrency` requests outstanding, each
+    client sending its next request as soon as the last one returns, which
+    measures peak throughput. Open-loop scenarios start requests at a fixed
+    `rps` whether or not earlier ones finished; latency is measured from the
+    scheduled start, so queueing in an overloaded service shows up in the
+    tail instead of being hidden by a slower send rate.
+    """
+
+    def __init__(self, client, payloads):
+        self.client = client
+        self.payloads = payloads
+        self._next_payload = 0
+
+    def _request(self, scenario):
+        """Method, URL and body of the next request of a scenario."""
+        batch_size = scenario.get('batch_size', 1)
+        records = [self.payloads[(self._next_payload + i) % len(self.payloads)] for i in range(batch_size)]
+        self._next_payload = (self._next_payload + batch_size) % len(self.payloads)
+        if scenario['route'] == '/predict':
+            return json.dumps(records[0]).encode(), {'content-type': 'application/json'}
+        if scenario['route'] == '/predict/stream':
+            return ''.join(json.dumps(record) + '\n' for record in records).encode(), {'content-type': 'application/x-ndjson'}
+        return json.dumps(records).encode(), {'content-type': 'application/json'}
+
+    async def _send(self, scenario, scheduled, latencies, statuses):
+        body, headers = self._request(scenario)
+        try:
+            response = await self.client.post(scenario['route'], content=body, headers=headers)
+            status = response.status_code
+        except httpx.HTTPError as e:
+            logging.debug(f"Request failed: {e}")
+            status = 'error'
+        latencies.append(time.perf_counter() - scheduled)
+        statuses.append(status)
+
+    async def _closed_loop(self, scenario, latencies, statuses):
+        deadline = time.perf_counter() + scenario['duration']
+
+        async def client_loop():
+            while time.perf_counter() < deadline:
+                await self._send(scenario, time.perf_counter(), latencies, statuses)
+        await asyncio.gather(*[client_loop() for _ in range(scenario['concurrency'])])
+
+    async def _open_loop(self, scenario, latencies, statuses):
+        start = time.perf_counter()
+        n_requests = int(scenario['rps'] * scenario['duration'])
+        tasks = []
+        for i in range(n_requests):
+            scheduled = start + i / scenario['rps']
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self._send(scenario, scheduled, latencies, statuses)))
+        await asyncio.gather(*tasks)
+
+    async def run_scenario(self, scenario):
+        latencies, statuses = [], []
+        start = time.perf_counter()
+        if scenario['mode'] == 'closed':
+            await self._closed_loop(scenario, latencies, statuses)
+        elif scenario['mode'] == 'open':
+            await self._open_loop(scenario, latencies, statuses)
+        else:
+            raise ValueError(f"Unknown mode '{scenario['mode']}', expected closed or open")
+        elapsed = time.perf_counter() - start
+        result = summarize(scenario['name'], scenario, latencies, statuses, elapsed, scenario.get('batch_size', 1))
+        logging.info(f"{result['name']}: {result['requests_per_sec']:.0f} req/s, {result['rows_per_sec']:.0f} rows/s, "
+                     f"p50={result['latency_ms']['p50']:.2f}ms p95={result['latency_ms']['p95']:.2f}ms "
+                     f"p99={result['latency_ms']['p99']:.2f}ms max={result['latency_ms']['max']:.2f}ms, "
+                     f"errors={result['errors']}")
+        return result
+
+    async def wait_until_ready(self, timeout=60.0):
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            try:
+                if (await self.client.get('/ready')).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.1)
+        raise RuntimeError(f"Service not ready after {timeout}s")
+
+    async def run(self, scenarios, warmup_requests=50):
+        await self.wait_until_ready()
+        for _ in range(warmup_requests):
+            await self._send({'route': '/predict'}, time.perf_counter(), [], [])
+        return [await self.run_scenario(scenario) for scenario in scenarios]
+
+
+def compare_to_baseline(results, baseline, tolerance=0.1):
+    """List regressions of p99 latency, throughput or error rate beyond `tolerance`."""
+    baseline_by_name = {result['name']: result for result in baseline}
+    regressions = []
+    for result in results:
+        reference = baseline_by_name.get(result['name'])
+        if reference is None:
+            continue
+        name = result['name']
+        if reference['latency_ms']['p99'] and result['latency_ms']['p99'] > reference['latency_ms']['p99'] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {result['latency_ms']['p99']:.2f}ms vs baseline {reference['latency_ms']['p99']:.2f}ms")
+        if result['rows_per_sec'] < reference['rows_per_sec'] * (1 - tolerance):
+            regressions.append(f"{name}: {result['rows_per_sec']:.0f} rows/s vs baseline {reference['rows_per_sec']:.0f} rows/s")
+        if result['error_rate'] > reference['error_rate'] + 0.001:
+            regressions.append(f"{name}: error rate {result['error_rate']:.2%} vs baseline {reference['error_rate']:.2%}")
+    return regressions
+
+
+async def run_load_test(scenarios, payloads, url=None, app_module='fastapp'):
+    """Run scenarios over HTTP against `url`, or in-process against the app's ASGI interface."""
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    if url is not None:
+        async with httpx.AsyncClient(base_url=url, timeout=60.0, limits=limits) as client:
+            return await LoadTester(client, payloads).run(scenarios)
+
+    app = importlib.import_module(app_module).app
+    # ASGITransport does not run lifespan events, so startup and shutdown are driven here
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://load-test', timeout=60.0) as client:
+            return await LoadTester(client, payloads).run(scenarios)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default="parameters.yaml", help="Path to the configuration file")
+    parser.add_argument("--url", help="Base URL of a running service; default runs fastapp:app in-process")
+    parser.add_argument("--payloads", help="JSONL file of recorded trips; default synthesizes them from the schema")
+    parser.add_argument("--scenario", action='append', help="Only run the named scenarios")
+    parser.add_argument("--output", help="Where to write the results JSON")
+    parser.add_argument("--baseline", help="Results JSON to compare against")
+    parser.add_argument("--save-baseline", action='store_true', help="Also store the results as the new baseline")
+    args = parser.parse_args()
+
+    configure_logger(args.config)
+    # httpx logs every request at INFO, which would flood the log and skew the timings
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    load_test_config = read_config(args.config)['load_test']
+    scenarios = [scenario for scenario in load_test_config['scenarios']
+                 if not args.scenario or scenario['name'] in args.scenario]
+
+    if args.payloads:
+        payloads = load_payloads(args.payloads)
+    else:
+        from fastapp import InputData
+        fields = {name: field.annotation for name, field in InputData.model_fields.items()}
+        payloads = synthesize_payloads(load_test_config['schema'], fields)
+
+    results = asyncio.run(run_load_test(scenarios, payloads, url=args.url))
+
+    output_path = args.output or load_test_config['output']
+    with open(output_path, 'w') as file:
+        json.dump(results, file, indent=4)
+    logging.info(f"Results written to {output_path}")
+
+    baseline_path = args.baseline or load_test_config['baseline']
+    if args.save_baseline:
+        with open(baseline_path, 'w') as file:
+            json.dump(results, file, indent=4)
+        logging.info(f"Baseline saved to {baseline_path}")
+    else:
+        try:
+            with open(baseline_path, 'r') as file:
+                baseline = json.load(file)
+        except FileNotFoundError:
+            logging.warning(f"No baseline at {baseline_path}, skipping the regression check")
+            baseline = []
+        regressions = compare_to_baseline(results, baseline, tolerance=load_test_config['tolerance'])
+        for regression in regressions:
+            logging.error(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,229 @@
+import time
+import bisect
+import threading
+import numpy as np
+
+
+# Upper bounds in seconds, fine enough below 10ms to read p99 off single-trip latencies
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class _Metric:
+    """Named metric with one child per label combination, rendered as Prometheus text."""
+
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).append(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, **labels):
+        """The child for these label values; hot paths should bind it once and reuse it."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def clear(self):
+        with self._lock:
+            self._children = {}
+
+    def _samples(self, key, child):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for key, child in children:
+            lines.extend(self._samples(key, child))
+        return lines
+
+
+class _Value:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def _samples(self, key, child):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"]
+
+
+class Gauge(Counter):
+    type_name = 'gauge'
+
+
+class _HistogramValue:
+    __slots__ = ('bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def observe_many(self, values):
+        """Observe a whole array with one vectorized bucket search."""
+        values = np.asarray(values, dtype=np.float64)
+        counts = np.bincount(np.searchsorted(self.bounds, values, side='left'), minlength=len(self.counts))
+        with self._lock:
+            for index in np.flatnonzero(counts):
+                self.counts[index] += int(counts[index])
+            self.sum += float(values.sum())
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    """Context manager observing the elapsed wall time of its block."""
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def _samples(self, key, child):
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+        samples, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = 'le="+Inf"' if bound == float('inf') else f'le="{_format_value(bound)}"'
+            samples.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+        samples.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+        samples.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return samples
+
+
+REGISTRY = []
+
+
+def render_metrics(registry=None):
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in (REGISTRY if registry is None else registry):
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting, timing and tracking in-flight requests per route.
+
+    Paths that match no route are labelled "other" so unknown URLs can't
+    grow the label set. The arrival time is left in the request state as
+    `request_start` for handlers that time the stages before them.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths = None
+
+    def _route(self, scope):
+        if self._route_paths is None:
+            self._route_paths = {route.path for route in scope['app'].routes}
+        return scope['path'] if scope['path'] in self._route_paths else 'other'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        scope.setdefault('state', {})['request_start'] = start
+        route = self._route(scope)
+        status = [500]
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        in_flight = REQUESTS_IN_FLIGHT.labels(route=route)
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            REQUEST_LATENCY.labels(route=route).observe(time.perf_counter() - start)
+            REQUESTS.labels(route=route, method=scope['method'], status=status[0]).inc()
+
+
+# Serving metrics, shared by the API, the micro-batcher and the model bundle
+REQUESTS = Counter('nyc_taxi_http_requests_total', 'HTTP requests by route, method and status code.',
+                   ['route', 'method', 'status'])
+REQUESTS_IN_FLIGHT = Gauge('nyc_taxi_http_requests_in_flight', 'HTTP requests being processed.', ['route'])
+REQUEST_LATENCY = Histogram('nyc_taxi_http_request_duration_seconds', 'End-to-end request latency.', ['route'])
+STAGE_LATENCY = Histogram('nyc_taxi_prediction_stage_duration_seconds',
+                          'Latency of each prediction stage (per call, which may cover a whole batch).', ['stage'])
+PREDICTIONS = Counter('nyc_taxi_predictions_total', 'Rows scored by the model (cache hits excluded), by model version.', ['model_version'])
+MODEL_INFO = Gauge('nyc_taxi_model_info', 'Model version currently served (value is always 1).', ['model_version'])
@@ -0,0 +1,127 @@
+import time
+import asyncio
+import logging
+from fastapi.concurrency import run_in_threadpool
+
+from prediction_app.metrics import STAGE_LATENCY
+from prediction_app.admission import DeadlineExceeded, check_deadline
+
+_QUEUE_LATENCY = STAGE_LATENCY.labels(stage='queue')
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-trip requests into one vectorized predict.
+
+    Each request puts its record on a queue and awaits a future. A worker
+    takes the first waiting record, keeps collecting until `max_batch_size`
+    records are queued or `max_wait` seconds have passed, then runs
+    `predict_fn(records)` once in the threadpool and resolves every future
+    with its own row. While a batch is being scored new requests pile up,
+    so batches grow with load and stay at one row when the service is idle.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=64, max_wait=0.002, workers=1):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.workers = workers
+        self._queue = None
+        self._tasks = []
+
+        # Batch size histogram (upper bound -> count) and queue wait totals
+        self.batch_size_buckets = [2 ** i for i in range(max_batch_size.bit_length()) if 2 ** i < max_batch_size] + [max_batch_size]
+        self.batch_size_counts = {bucket: 0 for bucket in self.batch_size_buckets}
+        self.n_batches = 0
+        self.n_records = 0
+        self.queue_wait_sum = 0.0
+        self.queue_wait_max = 0.0
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        return self
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, record, deadline=None):
+        """Queue one record and wait for its prediction row.
+
+        A record whose `deadline` (a time.perf_counter value) has passed by
+        the time its batch is dispatched is dropped with DeadlineExceeded.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((record, future, time.perf_counter(), deadline))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _record_stats(self, batch, dispatched):
+        self.n_batches += 1
+        self.n_records += len(batch)
+        for bucket in self.batch_size_buckets:
+            if len(batch) <= bucket:
+                self.batch_size_counts[bucket] += 1
+                break
+        for _, _, enqueued, _ in batch:
+            wait = dispatched - enqueued
+            self.queue_wait_sum += wait
+            self.queue_wait_max = max(self.queue_wait_max, wait)
+            _QUEUE_LATENCY.observe(wait)
+
+    @staticmethod
+    def _expired(item):
+        _, future, _, deadline = item
+        try:
+            check_deadline(deadline)
+        except DeadlineExceeded as e:
+            future.set_exception(e)
+            return True
+        return False
+
+    async def _worker(self):
+        while True:
+            batch = await self._collect()
+            self._record_stats(batch, time.perf_counter())
+
+            # Requests cancelled while queued (client gone) or past their deadline are skipped
+            batch = [item for item in batch if not item[1].cancelled() and not self._expired(item)]
+            if not batch:
+                continue
+            try:
+                predictions = await run_in_threadpool(self.predict_fn, [record for record, _, _, _ in batch])
+            except Exception as e:
+                logging.error(f"Micro-batch of {len(batch)} failed: {e}")
+                for _, future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for i, (_, future, _, _) in enumerate(batch):
+                if not future.done():
+                    future.set_result(predictions[i:i + 1])
+
+    def stats(self):
+        return {
+            "batches": self.n_batches,
+            "records": self.n_records,
+            "mean_batch_size": self.n_records / self.n_batches if self.n_batches else 0.0,
+            "batch_size_histogram": {f"le_{bucket}": count for bucket, count in self.batch_size_counts.items()},
+            "mean_queue_wait_ms": 1e3 * self.queue_wait_sum / self.n_records if self.n_records else 0.0,
+            "max_queue_wait_ms": 1e3 * self.queue_wait_max,
+            "queued": self._queue.qsize() if self._queue is not None else 0
+        }
@@ -0,0 +1,313 @@
+import os
+import io
+import json
+import errno
+import shutil
+import tempfile
+import pickle
+import hashlib
+import logging
+import datetime
+import threading
+import contextlib
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+from prediction_app.compiled_model import CompiledTreeEnsemble
+from prediction_app.feature_mapping import FeatureMapper, keys_list, continuous_cols
+from prediction_app.metrics import STAGE_LATENCY
+
+
+BUNDLE_FILES = ['model.pkl', 'X_scaler.pkl', 'y_scaler.pkl']
+
+_SCALE_LATENCY = STAGE_LATENCY.labels(stage='scale')
+_PREDICT_LATENCY = STAGE_LATENCY.labels(stage='predict')
+_INVERSE_TRANSFORM_LATENCY = STAGE_LATENCY.labels(stage='inverse_transform')
+
+
+def _sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def publish_bundle(deployment_dir, source_files, model_name, keep_versions=5, metadata=None):
+    """Publish model and scaler files as a new version and switch `current` to it.
+
+    `source_files` maps bundle file names (see BUNDLE_FILES) to source paths.
+    The version directory is fully written before the `current` symlink is
+    replaced with os.replace, so readers only ever see a complete bundle.
+
+    Each publish stages its files in its own temporary directory. Versions
+    are named by the second and the model checksum, so when that version
+    already exists (the same model published twice in one second, or by
+    concurrent publishers) the new one gets a `-2`, `-3`, ... suffix.
+    """
+    missing = [name for name in BUNDLE_FILES if name not in source_files]
+    if missing:
+        raise ValueError(f"Bundle is missing required files: {missing}")
+
+    versions_dir = os.path.join(deployment_dir, 'versions')
+    os.makedirs(versions_dir, exist_ok=True)
+
+    checksums = {name: _sha256(path) for name, path in source_files.items()}
+    timestamp = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
+    base_version = f"v{timestamp}-{checksums['model.pkl'][:8]}"
+
+    tmp_dir = tempfile.mkdtemp(prefix=base_version + '.', suffix='.tmp', dir=versions_dir)
+    try:
+        for name, path in source_files.items():
+            shutil.copy(path, os.path.join(tmp_dir, name))
+
+        manifest = {
+            'model_name': model_name,
+            'created': str(datetime.datetime.now()),
+            'files': checksums,
+            **(metadata or {})
+        }
+        for attempt in range(1, 1000):
+            version = base_version if attempt == 1 else f"{base_version}-{attempt}"
+            version_dir = os.path.join(versions_dir, version)
+            if os.path.exists(version_dir):
+                continue
+            with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as file:
+                json.dump({'version': version, **manifest}, file, indent=4)
+            try:
+                # rename, unlike os.replace, never replaces an existing version directory
+                os.rename(tmp_dir, version_dir)
+                break
+            except OSError as e:
+                # Another publisher took this version since the check
+                if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                    raise
+        else:
+            raise FileExistsError(f"No free version name for '{base_version}' in '{versions_dir}'")
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    # Atomically repoint `current` (a relative link, so the tree can be moved)
+    current_link = os.path.join(deployment_dir, 'current')
+    tmp_link = f"{current_link}.{os.getpid()}-{threading.get_ident()}.tmp"
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(os.path.join('versions', version), tmp_link)
+    os.replace(tmp_link, current_link)
+    logging.info(f"Published bundle '{version}' to '{deployment_dir}'")
+
+    _prune_versions(versions_dir, keep=keep_versions, active=version)
+    return version_dir
+
+
+def publish_model(deployment_dir, model, scaler_dir, model_name, keep_versions=5, metadata=None):
+    """Publish an in-memory sklearn model with the scalers in scaler_dir as a new bundle."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source_files = {
+            'model.pkl': os.path.join(tmp_dir, 'model.pkl'),
+            'X_scaler.pkl': os.path.join(scaler_dir, 'X_scaler.pkl'),
+            'y_scaler.pkl': os.path.join(scaler_dir, 'y_scaler.pkl')
+        }
+        with open(source_files['model.pkl'], 'wb') as file:
+            pickle.dump(model, file)
+
+        try:
+            compiled_model_path = os.path.join(tmp_dir, 'compiled_model.npz')
+            CompiledTreeEnsemble.from_sklearn(model).save(compiled_model_path)
+            source_files['compiled_model.npz'] = compiled_model_path
+        except ValueError as e:
+            logging.warning(f"Publishing without a compiled model: {e}")
+
+        return publish_bundle(deployment_dir, source_files, model_name,
+                              keep_versions=keep_versions, metadata=metadata)
+
+
+def _prune_versions(versions_dir, keep, active):
+    """Delete the oldest version directories, never the active one."""
+    versions = sorted(name for name in os.listdir(versions_dir) if not name.endswith('.tmp'))
+    for name in versions[:-keep] if keep else []:
+        if name != active:
+            shutil.rmtree(os.path.join(versions_dir, name), ignore_errors=True)
+            logging.info(f"Removed old bundle '{name}'")
+
+
+# The compiled model walks the trees row by row and only wins on small batches;
+# above this many rows sklearn's vectorized predict is 2-3x faster
+COMPILED_MODEL_MAX_ROWS = 64
+
+
+class ModelBundle:
+    """Model, scalers and version of one deployment, held in memory.
+
+    Bundles are never mutated after loading, so one instance can be shared
+    by every request thread. `bundle_dir` is the version directory a bundle
+    was loaded from, or None for models loaded from the registry.
+    """
+
+    def __init__(self, model, X_scaler, y_scaler, version, manifest=None, compiled_model=None, bundle_dir=None):
+        self.model = model
+        self.X_scaler = X_scaler
+        self.y_scaler = y_scaler
+        self.version = version
+        self.manifest = manifest or {}
+        self.compiled_model = compiled_model
+        self.bundle_dir = bundle_dir
+
+        feature_columns = getattr(model, 'feature_names_in_', None)
+        self.feature_mapper = FeatureMapper(list(feature_columns) if feature_columns is not None else keys_list)
+
+    @classmethod
+    def load(cls, bundle_dir, verify_checksums=True, mmap_model=False):
+        """Load a version directory written by `publish_bundle`.
+
+        Every file is checked against the sha256 recorded in the manifest,
+        so a truncated or tampered snapshot is rejected instead of served.
+        With `mmap_model` the compiled model's node arrays are memory-mapped
+        so forked workers and other processes share them.
+        """
+        bundle_dir = os.path.realpath(bundle_dir)
+        with open(os.path.join(bundle_dir, 'manifest.json'), 'r') as file:
+            manifest = json.load(file)
+
+        def read_file(file_name):
+            with open(os.path.join(bundle_dir, file_name), 'rb') as file:
+                content = file.read()
+            if verify_checksums and hashlib.sha256(content).hexdigest() != manifest['files'].get(file_name):
+                raise ValueError(f"Checksum mismatch for '{file_name}' in bundle '{manifest['version']}'")
+            return content
+
+        def load_pickle(file_name):
+            return pickle.loads(read_file(file_name))
+
+        compiled_model = None
+        if 'compiled_model.npz' in manifest['files'] and mmap_model:
+            compiled_model_path = os.path.join(bundle_dir, 'compiled_model.npz')
+            if verify_checksums and _sha256(compiled_model_path) != manifest['files']['compiled_model.npz']:
+                raise ValueError(f"Checksum mismatch for 'compiled_model.npz' in bundle '{manifest['version']}'")
+            compiled_model = CompiledTreeEnsemble.load(compiled_model_path, mmap=True)
+        elif 'compiled_model.npz' in manifest['files']:
+            compiled_model = CompiledTreeEnsemble.load(io.BytesIO(read_file('compiled_model.npz')))
+
+        return cls(model=load_pickle('model.pkl'),
+                   X_scaler=load_pickle('X_scaler.pkl'),
+                   y_scaler=load_pickle('y_scaler.pkl'),
+                   version=manifest['version'],
+                   manifest=manifest,
+                   compiled_model=compiled_model,
+                   bundle_dir=bundle_dir)
+
+    def predict(self, data):
+        """Scale the mapped features, predict and return fares in original units."""
+        data[continuous_cols] = self.X_scaler.transform(data[continuous_cols])
+        prediction = self.model.predict(data)
+        return self.y_scaler.inverse_transform(prediction.reshape(-1, 1))
+
+    def predict_matrix(self, X, observe_stages=True):
+        """Predict from a float64 matrix laid out like `feature_mapper.feature_columns`.
+
+        Standard scaling is applied in place with the same arithmetic sklearn
+        uses, and batches of up to `COMPILED_MODEL_MAX_ROWS` rows use the
+        compiled model when the bundle ships one, so no DataFrame is built
+        for single requests; results match `predict` exactly either way.
+        `observe_stages=False` keeps the call out of the stage histograms.
+        """
+        def timed(histogram):
+            return histogram.time() if observe_stages else contextlib.nullcontext()
+
+        cont_idx = self.feature_mapper.continuous_index
+        with timed(_SCALE_LATENCY):
+            if isinstance(self.X_scaler, StandardScaler):
+                continuous = X[:, cont_idx]
+                if self.X_scaler.with_mean:
+                    continuous -= self.X_scaler.mean_
+                if self.X_scaler.with_std:
+                    continuous /= self.X_scaler.scale_
+                X[:, cont_idx] = continuous
+            else:
+                columns = [self.feature_mapper.feature_columns[i] for i in cont_idx]
+                X[:, cont_idx] = self.X_scaler.transform(pd.DataFrame(X[:, cont_idx], columns=columns))
+
+        with timed(_PREDICT_LATENCY):
+            if self.compiled_model is not None and len(X) <= COMPILED_MODEL_MAX_ROWS:
+                prediction = self.compiled_model.predict(X)
+            else:
+                prediction = self.model.predict(pd.DataFrame(X, columns=self.feature_mapper.feature_columns))
+
+        with timed(_INVERSE_TRANSFORM_LATENCY):
+            return self.y_scaler.inverse_transform(prediction.reshape(-1, 1))
+
+
+class BundleWatcher:
+    """Follow the `current` symlink and hot-swap the loaded bundle.
+
+    A daemon thread polls the link target; when it changes, the new bundle
+    is loaded off the request path and then swapped in with a single
+    reference assignment. Callers read `watcher.bundle` once per request,
+    so in-flight requests finish on the bundle they started with.
+
+    `on_swap`, if given, is called with each bundle the thread swaps in
+    (not the one `start` loads), after requests already use it.
+    """
+
+    def __init__(self, deployment_dir, poll_interval=5.0, verify_checksums=True, mmap_model=False, on_swap=None):
+        self.current_link = os.path.join(deployment_dir, 'current')
+        self.poll_interval = poll_interval
+        self.verify_checksums = verify_checksums
+        self.mmap_model = mmap_model
+        self.on_swap = on_swap
+        self.bundle = None
+        self._loaded_target = None
+        self._failed_target = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _target(self):
+        if not os.path.lexists(self.current_link):
+            return None
+        return os.path.realpath(self.current_link)
+
+    def refresh(self):
+        """Load the bundle `current` points to if it differs from the loaded one."""
+        target = self._target()
+        if target is None or target in (self._loaded_target, self._failed_target):
+            return False
+        try:
+            bundle = ModelBundle.load(target, verify_checksums=self.verify_checksums,
+                                     mmap_model=self.mmap_model)
+        except Exception as e:
+            self._failed_target = target
+            logging.error(f"Failed to load bundle from '{target}', keeping current one. Error: {e}")
+            return False
+
+        previous = self.bundle.version if self.bundle else None
+        self.bundle = bundle
+        self._loaded_target = target
+        logging.info(f"Serving bundle '{bundle.version}' (previous: {previous})")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            if self.refresh() and self.on_swap is not None:
+                try:
+                    self.on_swap(self.bundle)
+                except Exception as e:
+                    logging.error(f"Bundle swap hook failed for '{self.bundle.version}': {e}")
+
+    def start(self):
+        """Load the current bundle synchronously, then keep watching in the background.
+
+        Safe to call again in a forked child, where the parent's thread no
+        longer runs; the already loaded bundle is kept and a new thread started.
+        """
+        self.refresh()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='bundle-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -3,6 +3,7 @@ import yaml
 import pickle
 import pandas as pd
 import logging
+import threading
 
 import warnings
 warnings.simplefilter(action='ignore', category=Warning)
@@ -110,19 +111,33 @@ def map_data_to_df(input_data):
 
 
 
+_predictor = None
+_predictor_lock = threading.Lock()
+
+
+def get_predictor(config_path='parameters.yaml'):
+    """Return the process-wide ModelPredictor, loading config, model and scalers on first use."""
+    global _predictor
+    if _predictor is None:
+        with _predictor_lock:
+            if _predictor is None:
+                config = Files.read_yaml(config_path)
+                model_file_path = os.path.join(config['prediction_app']['model'], "model.pkl")
+                X_scaler_path = os.path.join(config['prediction_app']['scaler'], "X_scaler.pkl")
+                y_scaler_path= os.path.join(config['prediction_app']['scaler'], "y_scaler.pkl")
+                _predictor = ModelPredictor(model_file_path, X_scaler_path, y_scaler_path)
+    return _predictor
+
+
 def perform_prediction(data):
-    """Main function to load model and make predictions."""
+    """Main function to make predictions with the cached model."""
     try:
-        config = Files.read_yaml('parameters.yaml')
-        model_file_path = os.path.join(config['prediction_app']['model'])
-        X_scaler_path = os.path.join(config['prediction_app']['scaler'], "X_scaler.pkl")
-        y_scaler_path= os.path.join(config['prediction_app']['scaler'], "y_scaler.pkl")
         # input_schema_path = config['schema']['input']
 
         # if not  ModelPredictor.validate_data(schema, data):
         #     raise ValueError("Input data validation failed.")
 
-        predictor = ModelPredictor(model_file_path, X_scaler_path, y_scaler_path)
+        predictor = get_predictor()
         prediction = predictor.predict(data)
         
 
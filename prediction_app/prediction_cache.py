@@ -0,0 +1,95 @@
+import time
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """In-process LRU cache of predictions keyed on the mapped feature vector.
+
+    Keys are a 16-byte blake2b digest of the feature row, optionally with
+    the continuous columns rounded to `quantize_decimals` so near-identical
+    quotes share an entry. Entries expire after `ttl` seconds, the cache
+    holds at most `max_entries` rows, and it is cleared whenever it sees a
+    different model version. All methods are safe to call from threadpool
+    workers.
+    """
+
+    def __init__(self, max_entries=100000, ttl=300.0, quantize_decimals=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.quantize_decimals = quantize_decimals
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def make_keys(self, features, continuous_index=None):
+        """Digest each feature row; call before the features are scaled in place."""
+        if self.quantize_decimals is not None and continuous_index is not None and len(continuous_index):
+            features = features.copy()
+            features[:, continuous_index] = np.round(features[:, continuous_index], self.quantize_decimals)
+        features = np.ascontiguousarray(features, dtype=np.float64)
+        return [hashlib.blake2b(row.tobytes(), digest_size=16).digest() for row in features]
+
+    def _check_version(self, version):
+        # Caller holds the lock
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def lookup(self, keys, version):
+        """Return cached predictions for `keys` (None where missing)."""
+        now = time.monotonic()
+        values = []
+        with self._lock:
+            self._check_version(version)
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] < now:
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    values.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    values.append(entry[0])
+        return values
+
+    def store(self, keys, values, version):
+        """Insert predictions computed by model `version`."""
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            self._check_version(version)
+            for key, value in zip(keys, values):
+                self._entries[key] = (value, expires)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "model_version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
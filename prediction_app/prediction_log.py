@@ -0,0 +1,186 @@
+import os
+import time
+import logging
+import datetime
+import threading
+import collections
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from prediction_app.metrics import Counter
+
+ARROW_TYPES = {float: pa.float64(), int: pa.int64(), str: pa.string()}
+
+LOGGED_ROWS = Counter('nyc_taxi_prediction_log_rows_total',
+                      'Prediction log rows by outcome (buffered, dropped or written).', ['outcome'])
+
+
+class PredictionLogSink:
+    """Record served predictions to hourly parquet files without blocking requests.
+
+    `log` only appends a reference to the batch to a bounded in-memory
+    buffer; when the buffer already holds `capacity` rows the batch is
+    dropped and counted instead. A daemon thread drains the buffer every
+    `flush_interval` seconds (or as soon as `flush_rows` rows are waiting)
+    and appends each flush as one row group.
+
+    Files are laid out as `<directory>/date_hour=YYYY-MM-DD-HH/part-<pid>-<opened>.parquet`
+    (one per process and hour, so pre-forked workers never share a file).
+    A file is written hidden, as `.part-...parquet.inprogress`, and renamed
+    once its hour is over or the sink is closed; dataset readers skip dot
+    files, so they only ever see complete files.
+    An hour usually holds several files (one per worker, and per restart);
+    `modules.data_loader.read_data(directory)` reads the whole log, with
+    `date_hour` as a column, and `read_data(hour_dir)` a single hour.
+    """
+
+    def __init__(self, directory, feature_types, capacity=100000, flush_rows=10000, flush_interval=10.0):
+        self.directory = directory
+        self.capacity = capacity
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        # `feature_types` maps request fields to float, int or str
+        feature_schema = [pa.field(name, ARROW_TYPES[field_type]) for name, field_type in feature_types.items()]
+        self.schema = pa.schema(feature_schema + [
+            pa.field('model_version', pa.string()),
+            pa.field('prediction', pa.float64()),
+            pa.field('latency_ms', pa.float64()),
+            pa.field('served_at', pa.timestamp('us', tz='UTC'))
+        ])
+        self.feature_names = [field.name for field in feature_schema]
+
+        self._buffer = collections.deque()
+        self._buffered_rows = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._writer = None
+        self._writer_hour = None
+        self._writer_path = None
+
+        self.dropped_rows = 0
+        self.written_rows = 0
+        self._buffered_counter = LOGGED_ROWS.labels(outcome='buffered')
+        self._dropped_counter = LOGGED_ROWS.labels(outcome='dropped')
+        self._written_counter = LOGGED_ROWS.labels(outcome='written')
+
+    def log(self, features, predictions, model_version, latency):
+        """Queue one scored batch; never blocks and never raises on overflow.
+
+        `features` is a list of request dicts or a pyarrow Table with the
+        feature columns, `predictions` an (n, 1) array and `latency` the
+        seconds it took to score the batch.
+        """
+        n_rows = len(predictions)
+        with self._lock:
+            if self._buffered_rows + n_rows > self.capacity:
+                self.dropped_rows += n_rows
+                self._dropped_counter.inc(n_rows)
+                return False
+            self._buffered_rows += n_rows
+        self._buffer.append((features, predictions, model_version, latency, time.time()))
+        self._buffered_counter.inc(n_rows)
+        if self._buffered_rows >= self.flush_rows:
+            self._wake.set()
+        return True
+
+    def _to_table(self, features, predictions, model_version, latency, served_at):
+        n_rows = len(predictions)
+        if isinstance(features, pa.Table):
+            columns = [features.column(name).cast(field.type) if name in features.column_names
+                       else pa.nulls(n_rows, field.type)
+                       for name, field in zip(self.feature_names, self.schema)]
+        else:
+            columns = [pa.array([record.get(name) for record in features], type=field.type)
+                       for name, field in zip(self.feature_names, self.schema)]
+        columns += [
+            pa.array([model_version] * n_rows, type=pa.string()),
+            pa.array(np.asarray(predictions, dtype=np.float64).reshape(-1)),
+            pa.array(np.full(n_rows, latency * 1e3)),
+            pa.array(np.full(n_rows, int(served_at * 1e6), dtype=np.int64), type=pa.timestamp('us', tz='UTC'))
+        ]
+        return pa.Table.from_arrays(columns, schema=self.schema)
+
+    def _close_writer(self):
+        if self._writer is None:
+            return
+        self._writer.close()
+        directory, file_name = os.path.split(self._writer_path)
+        final_path = os.path.join(directory, file_name[1:-len('.inprogress')])
+        os.replace(self._writer_path, final_path)
+        logging.info(f"Prediction log file '{final_path}' completed")
+        self._writer = None
+        self._writer_hour = None
+
+    def _write(self, hour, table):
+        if hour != self._writer_hour:
+            self._close_writer()
+            hour_dir = os.path.join(self.directory, f"date_hour={hour}")
+            os.makedirs(hour_dir, exist_ok=True)
+            file_name = f"part-{os.getpid()}-{int(time.time())}.parquet"
+            self._writer_path = os.path.join(hour_dir, '.' + file_name + '.inprogress')
+            self._writer = pq.ParquetWriter(self._writer_path, self.schema)
+            self._writer_hour = hour
+        self._writer.write_table(table, row_group_size=max(table.num_rows, 1))
+
+    def flush(self):
+        """Write everything buffered so far, one row group per hour."""
+        entries = []
+        while self._buffer:
+            entries.append(self._buffer.popleft())
+        if not entries:
+            return 0
+        n_rows = sum(len(entry[1]) for entry in entries)
+        with self._lock:
+            self._buffered_rows -= n_rows
+
+        by_hour = {}
+        for entry in entries:
+            hour = datetime.datetime.fromtimestamp(entry[4], tz=datetime.timezone.utc).strftime('%Y-%m-%d-%H')
+            by_hour.setdefault(hour, []).append(self._to_table(*entry))
+        for hour, tables in sorted(by_hour.items()):
+            self._write(hour, pa.concat_tables(tables))
+
+        self.written_rows += n_rows
+        self._written_counter.inc(n_rows)
+        return n_rows
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+                # Finish the previous hour's file even when no new rows arrive
+                current_hour = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d-%H')
+                if self._writer_hour is not None and self._writer_hour != current_hour:
+                    self._close_writer()
+            except Exception as e:
+                logging.error(f"Prediction log flush failed: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='prediction-log', daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self):
+        """Stop the flush thread, write what is left and complete the open file."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        self._close_writer()
+
+    def stats(self):
+        return {
+            "buffered_rows": self._buffered_rows,
+            "capacity": self.capacity,
+            "written_rows": self.written_rows,
+            "dropped_rows": self.dropped_rows,
+            "open_file": self._writer_path if self._writer is not None else None
+        }
@@ -0,0 +1,135 @@
+import os
+import pickle
+import logging
+import threading
+
+from modules.read_config import read_config
+from prediction_app.model_bundle import BundleWatcher, ModelBundle
+
+
+class PredictorRegistry:
+    """Load the serving config, scalers and model once per process.
+
+    `load` is called from the application's startup hook; request handlers
+    then only read `registry.predictor`, which returns an immutable
+    ModelBundle that is safe to share across threads.
+
+    `prediction_app.model_source` picks where the model comes from:
+    `bundle` only serves the local checksummed snapshot and never touches
+    MLflow, `registry` always loads from the registry, and `auto` prefers
+    the snapshot and falls back to the registry when none is published.
+
+    `load` can be called again after it raised or found no model: it then
+    retries the registry (in `auto` and `registry` mode). A bundle published
+    later is picked up by the watcher, which calls `on_reload` with it.
+    """
+
+    def __init__(self, config_path='parameters.yaml'):
+        self.config_path = config_path
+        self.config = None
+        self.bundle_watcher = None
+        self.on_reload = None
+        self._registry_model = None
+        self._lock = threading.Lock()
+        self._config_lock = threading.Lock()
+
+    def _load_scaler(self, file_name):
+        scaler_path = os.path.join(self.config['prediction_app']['scaler'], file_name)
+        with open(scaler_path, 'rb') as file:
+            return pickle.load(file)
+
+    def _load_registry_model(self, stage=None):
+        """Fall back to the MLflow registry when no bundle has been published."""
+        # Imported here so bundle-only deployments never pay for importing mlflow
+        import mlflow.pyfunc
+
+        mlflow_config = self.config['mlflow_configuration']
+        stage = stage or self.config['prediction_app']['registry_stage']
+        model_uri = f"models:/{mlflow_config['registered_model_name']}/{stage}"
+        mlflow.set_tracking_uri(mlflow_config['remote_server_uri'])
+
+        model = mlflow.pyfunc.load_model(model_uri=model_uri)
+        logging.info(f"Loaded model from MLflow registry '{model_uri}'")
+        return ModelBundle(model=model,
+                           X_scaler=self._load_scaler('X_scaler.pkl'),
+                           y_scaler=self._load_scaler('y_scaler.pkl'),
+                           version=model_uri)
+
+    def read_config(self):
+        """Read the config without loading any model; repeated calls are no-ops."""
+        with self._config_lock:
+            if self.config is None:
+                self.config = read_config(self.config_path)
+            return self.config
+
+    def _bundle_swapped(self, bundle):
+        if self.on_reload is not None:
+            self.on_reload(bundle)
+
+    def load(self):
+        """Read the config and load the model and scalers; calls once a model is loaded are no-ops."""
+        with self._lock:
+            if self.bundle_watcher is not None:
+                # Restarts the watcher thread in workers forked after loading
+                self.bundle_watcher.start()
+            if self.ready:
+                return self
+
+            app_config = self.read_config()['prediction_app']
+            model_source = app_config['model_source']
+            if model_source not in ('auto', 'bundle', 'registry'):
+                raise ValueError(f"Unknown model_source '{model_source}', expected auto, bundle or registry")
+
+            if model_source != 'registry':
+                if self.bundle_watcher is None:
+                    # Serve the local snapshot and hot-swap it whenever `current` moves
+                    self.bundle_watcher = BundleWatcher(app_config['deployments'],
+                                                        poll_interval=app_config['bundle_poll_interval'],
+                                                        verify_checksums=app_config['verify_checksums'],
+                                                        mmap_model=app_config['mmap_model'],
+                                                        on_swap=self._bundle_swapped).start()
+                if self.bundle_watcher.bundle is not None:
+                    return self
+                if model_source == 'bundle':
+                    # Stay unready until the watcher picks up a published bundle
+                    logging.error(f"No valid bundle published in '{app_config['deployments']}'")
+                    return self
+
+            self._registry_model = self._load_registry_model()
+            return self
+
+    def load_candidate(self):
+        """Load the shadow model from `prediction_app.shadow`, or None when none is configured.
+
+        A fixed bundle version directory takes precedence over a registry
+        stage; the candidate is loaded once and never hot-swapped.
+        """
+        app_config = self.read_config()['prediction_app']
+        shadow_config = app_config['shadow']
+        if shadow_config['bundle']:
+            candidate = ModelBundle.load(shadow_config['bundle'], verify_checksums=app_config['verify_checksums'],
+                                         mmap_model=app_config['mmap_model'])
+            logging.info(f"Loaded shadow bundle '{candidate.version}'")
+            return candidate
+        if shadow_config['registry_stage']:
+            return self._load_registry_model(stage=shadow_config['registry_stage'])
+        return None
+
+    def close(self):
+        if self.bundle_watcher is not None:
+            self.bundle_watcher.stop()
+
+    @property
+    def ready(self):
+        """True once a model is available to serve requests."""
+        bundle = self.bundle_watcher.bundle if self.bundle_watcher is not None else None
+        return (bundle or self._registry_model) is not None
+
+    @property
+    def predictor(self):
+        """The bundle to use for the current request."""
+        bundle = self.bundle_watcher.bundle if self.bundle_watcher is not None else None
+        predictor = bundle or self._registry_model
+        if predictor is None:
+            raise RuntimeError("No model loaded, call PredictorRegistry.load() first.")
+        return predictor
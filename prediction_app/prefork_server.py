@@ -0,0 +1,169 @@
+import os
+import gc
+import time
+import signal
+import socket
+import logging
+import argparse
+import importlib
+import uvicorn
+
+from modules.read_config import read_config
+from modules.logger_configurator import configure_logger
+
+# run >> python -m prediction_app.prefork_server --workers 4
+
+
+def process_memory(pid):
+    """RSS, PSS, shared and private memory of a process in MiB (Linux only, else None).
+
+    PSS splits each shared page between the processes mapping it, so the
+    sum over all workers is the real footprint of the server.
+    """
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', 'r') as file:
+            for line in file:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    except OSError:
+        return None
+    return {
+        'rss_mb': fields.get('Rss', 0.0),
+        'pss_mb': fields.get('Pss', 0.0),
+        'shared_mb': fields.get('Shared_Clean', 0.0) + fields.get('Shared_Dirty', 0.0),
+        'private_mb': fields.get('Private_Clean', 0.0) + fields.get('Private_Dirty', 0.0)
+    }
+
+
+class PreforkServer:
+    """Load the app and its model once, then fork workers that share it.
+
+    The master imports the app module, loads and warms the model through
+    its `warm_up` hook and freezes the garbage collector, so the loaded
+    objects are never written to again and stay shared copy-on-write with
+    every forked worker. The compiled model's node arrays are memory-mapped
+    (`prediction_app.mmap_model`), so they are shared through the page cache
+    as well. All workers accept on one listening socket bound by the master.
+
+    The master restarts workers that exit and logs per-worker RSS/PSS every
+    `memory_report_interval` seconds. A bundle hot-swapped after the fork is
+    loaded by each worker separately and is not shared.
+    """
+
+    def __init__(self, app_module='fastapp', host='0.0.0.0', port=8000, workers=0, memory_report_interval=60):
+        self.app_module = app_module
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.memory_report_interval = memory_report_interval
+        self.app = None
+        self.socket = None
+        self.worker_pids = set()
+        self._stopping = False
+
+    def _preload(self):
+        start = time.perf_counter()
+        module = importlib.import_module(self.app_module)
+        module.warm_up()
+        self.app = module.app
+
+        # Objects created so far are never collected or touched by the GC again
+        gc.collect()
+        gc.freeze()
+        logging.info(f"Preloaded '{self.app_module}' in {time.perf_counter() - start:.2f}s")
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid:
+            self.worker_pids.add(pid)
+            return
+
+        # Worker: uvicorn installs its own shutdown handlers
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        exit_code = 0
+        try:
+            server = uvicorn.Server(uvicorn.Config(self.app, lifespan='on'))
+            server.run(sockets=[self.socket])
+        except Exception as e:
+            logging.error(f"Worker {os.getpid()} crashed: {e}")
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def report_memory(self):
+        """Log RSS/PSS of the master and every worker, and the total PSS."""
+        total_pss = 0.0
+        for role, pid in [('master', os.getpid())] + [('worker', pid) for pid in sorted(self.worker_pids)]:
+            memory = process_memory(pid)
+            if memory is None:
+                continue
+            total_pss += memory['pss_mb']
+            logging.info(f"{role} {pid}: rss={memory['rss_mb']:.1f}MiB pss={memory['pss_mb']:.1f}MiB "
+                         f"shared={memory['shared_mb']:.1f}MiB private={memory['private_mb']:.1f}MiB")
+        logging.info(f"{len(self.worker_pids)} workers, total pss={total_pss:.1f}MiB")
+
+    def _handle_stop(self, signum, frame):
+        self._stopping = True
+
+    def _reap(self):
+        while self.worker_pids:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            self.worker_pids.discard(pid)
+            if not self._stopping:
+                logging.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+
+    def _shutdown(self):
+        for pid in self.worker_pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in list(self.worker_pids):
+            os.waitpid(pid, 0)
+        self.worker_pids.clear()
+        self.socket.close()
+        logging.info("All workers stopped")
+
+    def run(self):
+        if not hasattr(os, 'fork'):
+            logging.warning("os.fork is not available, serving from a single process")
+            uvicorn.run(f"{self.app_module}:app", host=self.host, port=self.port)
+            return
+
+        self._preload()
+        self.socket = socket.create_server((self.host, self.port), backlog=2048)
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        logging.info(f"Listening on {self.host}:{self.port} with {self.workers} workers")
+
+        next_report = time.monotonic() + self.memory_report_interval
+        while not self._stopping:
+            while len(self.worker_pids) < self.workers:
+                self._spawn()
+            time.sleep(0.2)
+            self._reap()
+            if self.memory_report_interval and time.monotonic() >= next_report:
+                self.report_memory()
+                next_report = time.monotonic() + self.memory_report_interval
+        self._shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default="parameters.yaml", help="Path to the configuration file")
+    parser.add_argument("--app", default="fastapp", help="Module that defines `app` and `warm_up`")
+    parser.add_argument("--workers", type=int, help="Number of workers, 0 for one per CPU")
+    args = parser.parse_args()
+
+    configure_logger(args.config)
+    server_config = read_config(args.config)['prediction_app']['server']
+    PreforkServer(app_module=args.app,
+                  host=server_config['host'],
+                  port=server_config['port'],
+                  workers=args.workers if args.workers is not None else server_config['workers'],
+                  memory_report_interval=server_config['memory_report_interval']).run()
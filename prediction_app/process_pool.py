@@ -0,0 +1,174 @@
+import os
+import queue
+import logging
+import threading
+import numpy as np
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+
+from prediction_app.feature_mapping import keys_list
+from prediction_app.model_bundle import ModelBundle
+
+# Set in each worker process: the bundle it last scored with and the slots it attached to
+_bundle = None
+_segments = {}
+
+
+def _load_bundle(bundle_dir, verify_checksums):
+    global _bundle
+    if _bundle is None or _bundle.bundle_dir != bundle_dir:
+        # The compiled model is memory-mapped, so every worker shares one copy of it
+        _bundle = ModelBundle.load(bundle_dir, verify_checksums=verify_checksums, mmap_model=True)
+    return _bundle
+
+
+def _init_worker(bundle_dir, verify_checksums):
+    if bundle_dir is not None:
+        _load_bundle(bundle_dir, verify_checksums)
+
+
+def _attach(name):
+    segment = _segments.get(name)
+    if segment is None:
+        # Workers share the parent's resource tracker, so the segment is unlinked once, by the parent
+        segment = shared_memory.SharedMemory(name=name)
+        _segments[name] = segment
+    return segment
+
+
+def _predict_slot(bundle_dir, verify_checksums, slot_name, n_rows, n_features):
+    """Score the feature matrix in a shared slot and write the fares right after it."""
+    bundle = _load_bundle(bundle_dir, verify_checksums)
+    buffer = _attach(slot_name).buf
+    X = np.ndarray((n_rows, n_features), dtype=np.float64, buffer=buffer)
+    output = np.ndarray((n_rows,), dtype=np.float64, buffer=buffer, offset=X.nbytes)
+    output[:] = bundle.predict_matrix(X, observe_stages=False)[:, 0]
+    return n_rows
+
+
+class ProcessPoolBackend:
+    """Score large batches in worker processes so concurrent batches use every core.
+
+    Tree prediction holds the GIL for much of its work, so batches scored
+    in the threadpool of one service process run one at a time. Batches of
+    at least `min_rows` rows are instead split into chunks that fit a
+    shared-memory slot; the mapped features are copied into the slot, a
+    worker scores them in place and writes the fares back into the same
+    slot, and only the slot name and shape are pickled. Each worker loads
+    the bundle memory-mapped, so the model is shared through the page cache.
+
+    Only bundles loaded from disk can be sent to the workers; models loaded
+    from the registry, and smaller batches, are scored in-process.
+
+    The executor's manager thread and the slots belong to the process that
+    created the backend, so under the prefork server each worker creates its
+    own after the fork; a backend inherited across a fork accepts nothing.
+    """
+
+    def __init__(self, workers=0, min_rows=2048, slot_rows=10000, verify_checksums=True, bundle_dir=None):
+        self.workers = workers or multiprocessing.cpu_count()
+        self.min_rows = min_rows
+        self.verify_checksums = verify_checksums
+        # Room for `slot_rows` rows of the default layout plus their fares
+        self.slot_bytes = slot_rows * (len(keys_list) + 1) * np.dtype(np.float64).itemsize
+
+        self.pid = os.getpid()
+        self._slots = []
+        self._executor = None
+        try:
+            for _ in range(2 * self.workers):
+                self._slots.append(shared_memory.SharedMemory(create=True, size=self.slot_bytes))
+            # Spawned, not forked: the service process runs threads that a fork would copy mid-operation
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=_init_worker, initargs=(bundle_dir, verify_checksums))
+        except BaseException:
+            self.close()
+            raise
+        self._free_slots = queue.SimpleQueue()
+        for slot in self._slots:
+            self._free_slots.put(slot)
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+
+    def start(self):
+        """Spawn every worker and load the bundle now rather than on the first large batch.
+
+        If a worker fails to start, the backend is closed (its slots unlinked) and the error raised.
+        """
+        try:
+            futures = [self._executor.submit(_init_worker, None, self.verify_checksums) for _ in range(self.workers)]
+            for future in futures:
+                future.result()
+        except BaseException:
+            self.close()
+            raise
+        return self
+
+    def accepts(self, predictor, n_rows):
+        return n_rows >= self.min_rows and predictor.bundle_dir is not None and os.getpid() == self.pid
+
+    def _submit_chunk(self, predictor, X, output, start, stop):
+        n_features = X.shape[1]
+        slot = self._free_slots.get()
+        try:
+            features = np.ndarray((stop - start, n_features), dtype=np.float64, buffer=slot.buf)
+            features[:] = X[start:stop]
+            future = self._executor.submit(_predict_slot, predictor.bundle_dir, self.verify_checksums,
+                                           slot.name, stop - start, n_features)
+        except BaseException:
+            self._free_slots.put(slot)
+            raise
+
+        collected = threading.Event()
+
+        def collect(future):
+            # Copy the fares out and free the slot as soon as the chunk is done,
+            # so a request waiting for more slots never holds finished ones
+            try:
+                if future.exception() is None:
+                    output[start:stop] = np.ndarray((stop - start,), dtype=np.float64, buffer=slot.buf,
+                                                    offset=features.nbytes)
+            finally:
+                self._free_slots.put(slot)
+                collected.set()
+        future.add_done_callback(collect)
+        return future, collected
+
+    def predict_matrix(self, predictor, X):
+        """Same result as `predictor.predict_matrix(X)`, scored by the worker processes."""
+        n_rows, n_features = X.shape
+        chunk_rows = max(self.slot_bytes // ((n_features + 1) * X.itemsize), 1)
+        output = np.empty(n_rows, dtype=np.float64)
+        chunks = [self._submit_chunk(predictor, X, output, start, min(start + chunk_rows, n_rows))
+                  for start in range(0, n_rows, chunk_rows)]
+        for future, collected in chunks:
+            future.result()
+            # The result is set before done callbacks run, so also wait for the copy
+            collected.wait()
+        with self._lock:
+            self.batches += 1
+            self.rows += n_rows
+        return output.reshape(-1, 1)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        for slot in self._slots:
+            slot.close()
+            slot.unlink()
+        self._slots = []
+        logging.info("Process pool backend stopped")
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "min_rows": self.min_rows,
+            "slots": len(self._slots),
+            "slot_mb": self.slot_bytes / 2 ** 20,
+            "batches": self.batches,
+            "rows": self.rows
+        }
@@ -0,0 +1,243 @@
+import glob
+import json
+import logging
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from itertools import chain
+from operator import itemgetter
+
+from modules.build_schema import CATEGORICAL_DTYPES
+from prediction_app.metrics import Counter
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+          'August', 'September', 'October', 'November', 'December']
+
+VALIDATION_ERRORS = Counter('nyc_taxi_validation_errors_total',
+                            'Request rows outside the training data schema, by field.', ['field'])
+
+
+def load_schemas(pattern):
+    """Merge every SchemaBuilder schema matching `pattern` into one.
+
+    Numeric ranges are widened to cover all files; category values listed
+    under `unique_values` are united. Returns the schema and the file list.
+    """
+    files = sorted(glob.glob(pattern))
+    merged = {}
+    for file_path in files:
+        with open(file_path, 'r') as file:
+            schema = json.load(file)
+        for field, info in schema.items():
+            current = merged.setdefault(field, dict(info))
+            if current is info or current == info:
+                continue
+            if info.get('min_value') is not None and current.get('min_value') is not None:
+                current['min_value'] = min(current['min_value'], info['min_value'])
+                current['max_value'] = max(current['max_value'], info['max_value'])
+            if 'unique_values' in info and 'unique_values' in current:
+                current['unique_values'] = sorted(set(current['unique_values']) | set(info['unique_values']))
+    return merged, files
+
+
+class SchemaViolation(ValueError):
+    """Rows of a batch fall outside the schema; `result` holds the error mask."""
+
+    def __init__(self, result):
+        super().__init__(f"{result.n_invalid} rows outside the training data schema")
+        self.result = result
+
+
+class ValidationResult:
+    """Per-row, per-field error mask of one validated batch."""
+
+    def __init__(self, fields, errors):
+        self.fields = fields
+        self.errors = errors
+
+    @property
+    def invalid_rows(self):
+        return self.errors.any(axis=1)
+
+    @property
+    def n_invalid(self):
+        return int(self.invalid_rows.sum())
+
+    def field_counts(self):
+        counts = self.errors.sum(axis=0)
+        return {field: int(count) for field, count in zip(self.fields, counts) if count}
+
+    def row_errors(self, limit=20):
+        """The first `limit` invalid rows with the fields that failed."""
+        rows = np.flatnonzero(self.invalid_rows)[:limit]
+        return [{"row": int(row), "fields": [self.fields[i] for i in np.flatnonzero(self.errors[row])]}
+                for row in rows]
+
+
+class SchemaValidator:
+    """Check whole batches against a feature schema in a few vectorized operations.
+
+    The schema is compiled once: numeric fields into `mins`/`maxs` vectors
+    compared against an (n_rows, n_fields) matrix in one step, and each
+    categorical field into an index of allowed values that looks up every
+    row (or, for categorical inputs, every distinct value) in C. Allowed
+    categories come from the schema's `unique_values`, or are the weekday
+    and month names for `*_day` and `*_month` fields; other string fields
+    are not checked. NaN and missing values count as errors.
+    """
+
+    def __init__(self, schema, fields=None):
+        def wanted(field):
+            return fields is None or field in fields
+
+        self.numeric_fields = [field for field, info in schema.items()
+                               if wanted(field) and info.get('min_value') is not None and info.get('max_value') is not None]
+        self.mins = np.array([schema[field]['min_value'] for field in self.numeric_fields], dtype=np.float64)
+        self.maxs = np.array([schema[field]['max_value'] for field in self.numeric_fields], dtype=np.float64)
+
+        self.category_tables = {}
+        for field, info in schema.items():
+            if not wanted(field) or info.get('data_type') not in CATEGORICAL_DTYPES:
+                continue
+            allowed = info.get('unique_values')
+            if allowed is None and field.endswith('_day'):
+                allowed = WEEKDAYS
+            elif allowed is None and field.endswith('_month'):
+                allowed = MONTHS
+            if allowed is not None:
+                self.category_tables[field] = pd.Index(allowed)
+        self.category_fields = list(self.category_tables)
+        self.fields = self.numeric_fields + self.category_fields
+        self._arrow_tables = {field: pa.array(list(table), type=pa.string()) for field, table in self.category_tables.items()}
+        self._matrix_plans = {}
+
+    @classmethod
+    def from_files(cls, pattern, fields=None):
+        """Compile the schemas matching `pattern`, or return None when there are none."""
+        schema, files = load_schemas(pattern)
+        if not files:
+            logging.warning(f"No schema matches '{pattern}', request validation disabled")
+            return None
+        validator = cls(schema, fields)
+        logging.info(f"Compiled request validator for {len(validator.fields)} fields from {len(files)} schema file(s)")
+        return validator
+
+    def _check_numeric(self, values):
+        # Written as "not inside" so NaN fails too
+        with np.errstate(invalid='ignore'):
+            return ~((values >= self.mins) & (values <= self.maxs))
+
+    def _check_category(self, field, values):
+        table = self.category_tables[field]
+        if isinstance(values, (pa.Array, pa.ChunkedArray)):
+            # Already a membership mask computed by Arrow
+            return ~values.to_numpy(zero_copy_only=False).astype(bool)
+        if isinstance(getattr(values, 'dtype', None), pd.CategoricalDtype):
+            # Look up each distinct value once; code -1 (missing) picks the trailing False
+            categories = values.cat.categories if isinstance(values, pd.Series) else values.categories
+            codes = values.cat.codes.to_numpy() if isinstance(values, pd.Series) else values.codes
+            known = np.append(table.get_indexer(categories) >= 0, False)
+            return ~known[codes]
+        # Factorize in C, then look up only the distinct values; missing values get code -1
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        known = np.append(table.get_indexer(uniques) >= 0, False)
+        return ~known[codes]
+
+    def check_columns(self, columns, n_rows, feature_mapper=None):
+        """Validate a dict of field -> column (NumPy, pandas or lists); absent fields are skipped.
+
+        With `feature_mapper`, only the fields `check_matrix` checks for that
+        feature layout count, so a row gets the same verdict on every route.
+        """
+        errors = np.zeros((n_rows, len(self.fields)), dtype=bool)
+        present = [i for i, field in enumerate(self.numeric_fields) if field in columns]
+        if present:
+            values = np.column_stack([np.asarray(columns[self.numeric_fields[i]], dtype=np.float64) for i in present])
+            with np.errstate(invalid='ignore'):
+                errors[:, present] = ~((values >= self.mins[present]) & (values <= self.maxs[present]))
+        offset = len(self.numeric_fields)
+        for i, field in enumerate(self.category_fields):
+            if field in columns:
+                errors[:, offset + i] = self._check_category(field, columns[field])
+        if feature_mapper is not None:
+            errors[:, ~self._matrix_plan(feature_mapper)[3]] = False
+        return ValidationResult(self.fields, errors)
+
+    def check_records(self, records, feature_mapper=None):
+        """Validate a list of request dicts; a missing key fails its field (see `check_columns`)."""
+        n_rows = len(records)
+        n_numeric = len(self.numeric_fields)
+        if n_numeric:
+            getter = itemgetter(*self.numeric_fields) if n_numeric > 1 else lambda record: (record[self.numeric_fields[0]],)
+            try:
+                rows = map(getter, records)
+                values = np.fromiter(chain.from_iterable(rows), dtype=np.float64, count=n_rows * n_numeric)
+            except (KeyError, TypeError):
+                # Missing or null values: rebuild the rows field by field with NaN
+                nan = float('nan')
+                values = np.array([[nan if record.get(field) is None else record[field] for field in self.numeric_fields]
+                                   for record in records], dtype=np.float64)
+            columns = dict(zip(self.numeric_fields, values.reshape(n_rows, n_numeric).T))
+        else:
+            columns = {}
+        for field in self.category_fields:
+            columns[field] = [record.get(field) for record in records]
+        return self.check_columns(columns, n_rows, feature_mapper)
+
+    def check_table(self, table):
+        """Validate a pyarrow Table or RecordBatch with Arrow compute kernels; absent fields are skipped."""
+        columns = {}
+        for field in self.fields:
+            if field not in table.schema.names:
+                continue
+            column = table.column(field)
+            if field in self.category_tables and not pa.types.is_dictionary(column.type):
+                # Membership is tested in Arrow, so only the boolean result is converted
+                columns[field] = pc.is_in(column, value_set=self._arrow_tables[field])
+            elif field in self.category_tables:
+                columns[field] = column.to_pandas()
+            else:
+                columns[field] = column.to_numpy(zero_copy_only=False)
+        return self.check_columns(columns, table.num_rows)
+
+    def _matrix_plan(self, feature_mapper):
+        """Where each checked field lives in the mapper's feature matrix (cached per feature layout)."""
+        key = tuple(feature_mapper.feature_columns)
+        plan = self._matrix_plans.get(key)
+        if plan is None:
+            column_index = {column: i for i, column in enumerate(feature_mapper.feature_columns)}
+            numeric = [(i, column_index[field]) for i, field in enumerate(self.numeric_fields) if field in column_index]
+            onehot = []
+            for i, field in enumerate(self.category_fields):
+                if field not in feature_mapper.onehot_fields:
+                    continue
+                block = [column_index.get(f"{field}_{value}") for value in self.category_tables[field]]
+                # A row with no bit set is an unknown value only if every allowed value has a column
+                if None not in block:
+                    onehot.append((len(self.numeric_fields) + i, np.array(block, dtype=np.intp)))
+            checked = np.zeros(len(self.fields), dtype=bool)
+            checked[[i for i, _ in numeric] + [i for i, _ in onehot]] = True
+            plan = (np.array([i for i, _ in numeric], dtype=np.intp), np.array([j for _, j in numeric], dtype=np.intp),
+                    onehot, checked)
+            self._matrix_plans[key] = plan
+        return plan
+
+    def check_matrix(self, X, feature_mapper):
+        """Validate an already mapped feature matrix, at almost no cost.
+
+        Numeric fields are read from their feature columns and one-hot
+        fields fail when their block has no bit set. Fields the model does
+        not use (the months, for instance) are not in the matrix and are
+        not checked.
+        """
+        errors = np.zeros((len(X), len(self.fields)), dtype=bool)
+        field_index, column_index, onehot, _ = self._matrix_plan(feature_mapper)
+        if len(field_index):
+            with np.errstate(invalid='ignore'):
+                errors[:, field_index] = ~((X[:, column_index] >= self.mins[field_index]) &
+                                           (X[:, column_index] <= self.maxs[field_index]))
+        for i, block in onehot:
+            errors[:, i] = ~X[:, block].any(axis=1)
+        return ValidationResult(self.fields, errors)
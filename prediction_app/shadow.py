@@ -0,0 +1,182 @@
+import time
+import random
+import logging
+import threading
+import collections
+import numpy as np
+import pyarrow as pa
+
+from prediction_app.arrow_io import arrow_feature_columns
+from prediction_app.metrics import Counter, Histogram
+
+SHADOW_ROWS = Counter('nyc_taxi_shadow_rows_total',
+                      'Rows offered to the shadow model by outcome (compared, dropped, skipped or failed).', ['outcome'])
+SHADOW_ABS_DELTA = Histogram('nyc_taxi_shadow_abs_delta_dollars',
+                             'Absolute difference between the candidate and the live fare, per row.',
+                             buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 50.0))
+
+
+class ShadowEvaluator:
+    """Score a candidate model on the live traffic without touching the response.
+
+    `submit` is called with each batch the live model has just scored; it
+    only appends a reference to a bounded queue (a `sample_rate` share of
+    the batches, tail-dropped once `capacity` rows are waiting) and never
+    waits. A daemon thread maps each batch with the candidate's own feature
+    mapper, predicts and aggregates how far it lands from the live fares
+    and how long it took compared with the live model.
+
+    The absolute deltas of the last `window` rows are kept for percentiles;
+    everything else is running totals, so memory stays bounded.
+    """
+
+    def __init__(self, candidate, capacity=50000, sample_rate=1.0, window=10000):
+        self.candidate = candidate
+        self.capacity = capacity
+        self.sample_rate = sample_rate
+
+        self._queue = collections.deque()
+        self._queued_rows = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.live_versions = set()
+        self.batches = 0
+        self.compared_rows = 0
+        self.dropped_rows = 0
+        self.failed_rows = 0
+        self.delta_sum = 0.0
+        self.abs_delta_sum = 0.0
+        self.squared_delta_sum = 0.0
+        self.max_abs_delta = 0.0
+        self.live_seconds = 0.0
+        self.candidate_seconds = 0.0
+        self.recent_abs_deltas = collections.deque(maxlen=window)
+
+        self._compared_counter = SHADOW_ROWS.labels(outcome='compared')
+        self._dropped_counter = SHADOW_ROWS.labels(outcome='dropped')
+        self._skipped_counter = SHADOW_ROWS.labels(outcome='skipped')
+        self._failed_counter = SHADOW_ROWS.labels(outcome='failed')
+        self._abs_delta_histogram = SHADOW_ABS_DELTA.labels()
+
+    def submit(self, features, live_predictions, live_version, live_latency):
+        """Queue a batch the live model scored; returns False if it was sampled out or dropped.
+
+        `features` is the list of request dicts or the pyarrow Table that was
+        scored, so the candidate maps it with its own feature layout.
+        """
+        n_rows = len(live_predictions)
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self._skipped_counter.inc(n_rows)
+            return False
+        with self._lock:
+            if self._queued_rows + n_rows > self.capacity:
+                self.dropped_rows += n_rows
+                self._dropped_counter.inc(n_rows)
+                return False
+            self._queued_rows += n_rows
+        self._queue.append((features, live_predictions, live_version, live_latency))
+        self._wake.set()
+        return True
+
+    def _map(self, features):
+        mapper = self.candidate.feature_mapper
+        if isinstance(features, pa.Table):
+            columns = arrow_feature_columns(features, mapper.numeric_fields, mapper.onehot_fields)
+            return mapper.map_columns(columns, features.num_rows)
+        return mapper.map_records(features)
+
+    def _compare(self, features, live_predictions, live_version, live_latency):
+        n_rows = len(live_predictions)
+        start = time.perf_counter()
+        # Stage histograms describe the live model only
+        predictions = self.candidate.predict_matrix(self._map(features), observe_stages=False)
+        candidate_latency = time.perf_counter() - start
+
+        deltas = predictions[:, 0] - np.asarray(live_predictions, dtype=np.float64).reshape(-1)
+        abs_deltas = np.abs(deltas)
+        with self._lock:
+            self.live_versions.add(live_version)
+            self.batches += 1
+            self.compared_rows += n_rows
+            self.delta_sum += float(deltas.sum())
+            self.abs_delta_sum += float(abs_deltas.sum())
+            self.squared_delta_sum += float(np.dot(deltas, deltas))
+            self.max_abs_delta = max(self.max_abs_delta, float(abs_deltas.max()) if n_rows else 0.0)
+            self.live_seconds += live_latency
+            self.candidate_seconds += candidate_latency
+            self.recent_abs_deltas.extend(abs_deltas.tolist())
+        self._abs_delta_histogram.observe_many(abs_deltas)
+        self._compared_counter.inc(n_rows)
+
+    def drain(self):
+        """Compare every queued batch; returns the number of rows processed."""
+        processed = 0
+        while self._queue:
+            entry = self._queue.popleft()
+            n_rows = len(entry[1])
+            with self._lock:
+                self._queued_rows -= n_rows
+            try:
+                self._compare(*entry)
+            except Exception as e:
+                with self._lock:
+                    self.failed_rows += n_rows
+                self._failed_counter.inc(n_rows)
+                logging.error(f"Shadow scoring of {n_rows} rows with '{self.candidate.version}' failed: {e}")
+            processed += n_rows
+        return processed
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            self.drain()
+
+    def start(self):
+        """Start the comparison thread.
+
+        Safe to call again in a forked child, where the parent's thread no
+        longer runs; the loaded candidate is kept and a new thread started.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='shadow-evaluator', daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self):
+        """Stop the worker; batches still queued are discarded."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        with self._lock:
+            n_rows = self.compared_rows
+            recent = np.array(self.recent_abs_deltas)
+            return {
+                "candidate_version": self.candidate.version,
+                "running": self._thread is not None and self._thread.is_alive(),
+                "live_versions": sorted(self.live_versions),
+                "batches": self.batches,
+                "compared_rows": n_rows,
+                "queued_rows": self._queued_rows,
+                "dropped_rows": self.dropped_rows,
+                "failed_rows": self.failed_rows,
+                "mean_delta": self.delta_sum / n_rows if n_rows else None,
+                "mean_abs_delta": self.abs_delta_sum / n_rows if n_rows else None,
+                "rms_delta": float(np.sqrt(self.squared_delta_sum / n_rows)) if n_rows else None,
+                "max_abs_delta": self.max_abs_delta if n_rows else None,
+                "recent_abs_delta": {
+                    "rows": len(recent),
+                    "p50": float(np.percentile(recent, 50)) if len(recent) else None,
+                    "p95": float(np.percentile(recent, 95)) if len(recent) else None,
+                    "p99": float(np.percentile(recent, 99)) if len(recent) else None
+                },
+                "live_ms_per_batch": 1e3 * self.live_seconds / self.batches if self.batches else None,
+                "candidate_ms_per_batch": 1e3 * self.candidate_seconds / self.batches if self.batches else None
+            }
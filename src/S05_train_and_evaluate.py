@@ -129,7 +129,8 @@ class TrainEvaluate:
             live.log_metric("MAE", mae) # dvclive*
             live.log_metric("R2 Score", r2) # dvclive*       
             
-            save_metrics(model_name, model_params, rmse, mae, r2)
+            save_metrics(model_name, model_params, rmse, mae, r2, config=self.config,
+                         run_id=mlflow.active_run().info.run_id)
 
             return model_name, model
         
@@ -1,11 +1,14 @@
 import os
 import json
+import pickle
 import shutil
 import argparse
 import logging
 
 from modules.read_config import read_config
 from modules.logger_configurator import configure_logger
+from prediction_app.compiled_model import CompiledTreeEnsemble
+from prediction_app.model_bundle import publish_bundle
 
 
 class ModelToPredictionService:
@@ -16,6 +19,8 @@ class ModelToPredictionService:
         self.serving_model_dir = self.config['prediction_app']['model']
         self.scaler_dir=self.config['scaler_dir']
         self.serving_scaler_dir = self.config['prediction_app']['scaler']
+        self.deployment_dir = self.config['prediction_app']['deployments']
+        self.keep_versions = self.config['prediction_app'].get('keep_versions', 5)
 
 
     def _copy_best_model_to_prediction(self):
@@ -39,6 +44,31 @@ class ModelToPredictionService:
         # Copy best model to prediction_app directory
         shutil.copy(best_model_path, serving_model_path)
         logging.info(f"Copied '{best_model}' model to '{serving_model_path}'")
+        return best_model, serving_model_path
+
+
+    def _export_compiled_model(self, model_path):
+        """Flatten the serving tree model into NumPy node arrays next to model.pkl
+
+        Returns the path written, or None when the model cannot be compiled.
+        """
+
+        with open(model_path, 'rb') as file:
+            model = pickle.load(file)
+
+        compiled_model_path = os.path.join(self.serving_model_dir, 'compiled_model.npz')
+        try:
+            compiled_model = CompiledTreeEnsemble.from_sklearn(model)
+        except ValueError as e:
+            logging.warning(f"Skipping compiled model export: {e}")
+            # A previous model's compiled arrays must not be served under the new model
+            if os.path.exists(compiled_model_path):
+                os.remove(compiled_model_path)
+            return None
+
+        compiled_model.save(compiled_model_path)
+        logging.info(f"Compiled model with {len(compiled_model.roots)} trees saved to '{compiled_model_path}'")
+        return compiled_model_path
 
 
     def _copy_scaler_to_prediction(self):
@@ -59,9 +89,25 @@ class ModelToPredictionService:
                 # Log the action
                 logging.info(f"Scaler: '{file}' copied from '{source_scaler_file_path}' to '{destination_scaler_file_path}'.")
 
+
+    def _publish_serving_bundle(self, model_name, compiled_model_path=None):
+        """Publish model, scalers and the compiled model exported for it (if any) as a new deployment version"""
+
+        source_files = {
+            'model.pkl': os.path.join(self.serving_model_dir, 'model.pkl'),
+            'X_scaler.pkl': os.path.join(self.serving_scaler_dir, 'X_scaler.pkl'),
+            'y_scaler.pkl': os.path.join(self.serving_scaler_dir, 'y_scaler.pkl')
+        }
+        if compiled_model_path is not None:
+            source_files['compiled_model.npz'] = compiled_model_path
+
+        publish_bundle(self.deployment_dir, source_files, model_name, keep_versions=self.keep_versions)
+
     def exectute_model_to_prediction_service(self):
-            self._copy_best_model_to_prediction()
+            best_model, serving_model_path = self._copy_best_model_to_prediction()
+            compiled_model_path = self._export_compiled_model(serving_model_path)
             self._copy_scaler_to_prediction()
+            self._publish_serving_bundle(best_model, compiled_model_path)
 
 
 if __name__ =="__main__":
@@ -1,15 +1,17 @@
 import os
 import logging
-import pandas as pd
 import pickle
 import argparse
 import mlflow
 import mlflow.exceptions
+import mlflow.sklearn
 import getpass
 import logging
+from mlflow.entities import ViewType
 from mlflow.tracking import MlflowClient
 from modules.read_config import read_config
 from modules.logger_configurator import configure_logger
+from prediction_app.model_bundle import publish_model
 
 
 class ModelLogger:
@@ -18,20 +20,55 @@ class ModelLogger:
         self.mlflow_config = self.config["mlflow_configuration"]
         self.model_name = self.mlflow_config["registered_model_name"]
         self.remote_server_uri = self.mlflow_config["remote_server_uri"]
+        self.experiment_name = self.mlflow_config["experiment_name"]
+        self.run_filter_tags = self.mlflow_config.get("run_filter_tags") or {}
+        self.search_page_size = self.mlflow_config.get("search_page_size", 100)
         mlflow.set_tracking_uri(self.remote_server_uri)
         self.client = MlflowClient()
         self.user = getpass.getuser()
 
+    def _build_run_filter(self):
+        """Filter for finished runs that logged an MAE and carry the configured tags."""
+        clauses = ["attributes.status = 'FINISHED'", "metrics.MAE >= 0"]
+        for tag, value in self.run_filter_tags.items():
+            clauses.append(f"tags.`{tag}` = '{value}'")
+        return " and ".join(clauses)
+
+    def _iter_runs_by_mae(self, experiment_id, max_results=None):
+        """Yield runs ordered by ascending MAE, fetching one page at a time from the server."""
+        page_token = None
+        n_yielded = 0
+        while True:
+            page_size = self.search_page_size
+            if max_results is not None:
+                page_size = min(page_size, max_results - n_yielded)
+            runs = self.client.search_runs(experiment_ids=[experiment_id],
+                                           filter_string=self._build_run_filter(),
+                                           run_view_type=ViewType.ACTIVE_ONLY,
+                                           max_results=page_size,
+                                           order_by=["metrics.MAE ASC"],
+                                           page_token=page_token)
+            for run in runs:
+                yield run
+                n_yielded += 1
+            page_token = runs.token
+            if not page_token or (max_results is not None and n_yielded >= max_results):
+                return
+
     def _get_lowest_mae_run_id(self):
-        runs = mlflow.search_runs(experiment_ids=[1])
-        logging.info("All Run IDs: %s", runs["run_id"].tolist())
-        if "metrics.MAE" not in runs.columns:
-            logging.error("Column 'metrics.MAE' does not exist in the runs DataFrame.")
+        experiment = self.client.get_experiment_by_name(self.experiment_name)
+        if experiment is None:
+            logging.error("Experiment '%s' does not exist.", self.experiment_name)
+            return None
+
+        # The server sorts on MAE, so only the best run needs to be fetched
+        best_run = next(self._iter_runs_by_mae(experiment.experiment_id, max_results=1), None)
+        if best_run is None:
+            logging.error("No finished run with an MAE metric found in experiment '%s'.", self.experiment_name)
             return None
-        runs["metrics.MAE"] = pd.to_numeric(runs["metrics.MAE"], errors='coerce')
-        lowest = runs["metrics.MAE"].min()
-        best_run_id = runs[runs["metrics.MAE"] == lowest]["run_id"].iloc[0]
-        logging.info("Best run ID based on lowest MAE: %s", best_run_id)
+
+        best_run_id = best_run.info.run_id
+        logging.info("Best run ID based on lowest MAE: %s (MAE=%s)", best_run_id, best_run.data.metrics["MAE"])
         return best_run_id
 
     def create_model_version(self, lowest_run_id):
@@ -93,6 +130,7 @@ class ModelLogger:
             logging.error("Error transitioning model version to Production: %s", str(e))
 
         self.save_model(loaded_model, lowest_run_id, model_versions)
+        self.publish_snapshot(lowest_run_id)
 
 
     def save_model(self, loaded_model, lowest_run_id, model_versions):
@@ -104,6 +142,20 @@ class ModelLogger:
             pickle.dump(loaded_model, file)
         logging.info("Model saved to: %s", model_path)
 
+    def publish_snapshot(self, lowest_run_id):
+        """Publish the promoted model as a local bundle so the app can start without the registry."""
+        app_config = self.config["prediction_app"]
+        try:
+            sklearn_model = mlflow.sklearn.load_model(f"runs:/{lowest_run_id}/model")
+            version_dir = publish_model(app_config["deployments"], sklearn_model,
+                                        scaler_dir=self.config["scaler_dir"],
+                                        model_name=self.model_name,
+                                        keep_versions=app_config["keep_versions"],
+                                        metadata={"run_id": lowest_run_id, "registered_model_name": self.model_name})
+            logging.info("Published local model snapshot: %s", version_dir)
+        except Exception as e:
+            logging.error("Error publishing local model snapshot for run_id: %s. Error: %s", lowest_run_id, str(e))
+
     def run(self):
         self.log_production_model()
 
@@ -0,0 +1,74 @@
+import json
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import fastapp
+
+
+def fake_prediction(records, use_cache=False, validate=False):
+    return np.array([[record['trip_miles']] for record in records], dtype=np.float64)
+
+
+class NoParsing:
+    def validate_json(self, body):
+        raise AssertionError("Oversized body was parsed")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # No lifespan: the route is exercised without loading a model
+    monkeypatch.setattr(fastapp, 'is_ready', lambda: True)
+    monkeypatch.setattr(fastapp, 'perform_prediction', fake_prediction)
+    monkeypatch.setattr(fastapp.registry, 'config',
+                        {'prediction_app': {'max_batch_size': 3, 'max_batch_bytes': 4096}})
+    return TestClient(fastapp.app)
+
+
+def trips(n_trips):
+    return [{**fastapp.WARMUP_RECORD, "trip_miles": float(i)} for i in range(n_trips)]
+
+
+def test_batch_is_scored(client):
+    response = client.post('/batch_predict', json=trips(2))
+
+    assert response.status_code == 200
+    assert response.json()["predictions"] == [[0.0], [1.0]]
+
+
+@pytest.mark.parametrize("body", [b'[{"trip_miles": 1.0', b'[{}],[{}]', b'not json'],
+                         ids=['truncated', 'trailing characters', 'not json'])
+def test_malformed_json_is_422(client, body):
+    response = client.post('/batch_predict', content=body, headers={'content-type': 'application/json'})
+
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["type"] == 'json_invalid'
+
+
+def test_too_many_rows_is_413(client):
+    response = client.post('/batch_predict', json=trips(4))
+
+    assert response.status_code == 413
+
+
+def test_oversized_body_is_refused_before_parsing(client, monkeypatch):
+    monkeypatch.setattr(fastapp, 'trip_batch_adapter', NoParsing())
+    body = json.dumps(trips(10)).encode()
+
+    response = client.post('/batch_predict', content=body, headers={'content-type': 'application/json'})
+
+    assert response.status_code == 413
+    assert "4096" in response.json()["detail"]
+
+
+def test_oversized_chunked_body_is_refused_before_parsing(client, monkeypatch):
+    monkeypatch.setattr(fastapp, 'trip_batch_adapter', NoParsing())
+    body = json.dumps(trips(10)).encode()
+
+    def chunks():
+        for start in range(0, len(body), 1024):
+            yield body[start:start + 1024]
+
+    response = client.post('/batch_predict', content=chunks(), headers={'content-type': 'application/json'})
+
+    assert response.status_code == 413
@@ -0,0 +1,67 @@
+import os
+import pickle
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from sklearn.dummy import DummyRegressor
+from sklearn.preprocessing import StandardScaler
+
+from prediction_app import model_bundle
+from prediction_app.feature_mapping import keys_list, continuous_cols
+from prediction_app.model_bundle import ModelBundle, publish_bundle
+
+
+class FixedDatetime(datetime.datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2024, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def source_files(tmp_path):
+    X = pd.DataFrame(np.random.default_rng(0).random((20, len(keys_list))), columns=keys_list)
+    objects = {
+        'model.pkl': DummyRegressor().fit(X, np.zeros(20)),
+        'X_scaler.pkl': StandardScaler().fit(X[continuous_cols]),
+        'y_scaler.pkl': StandardScaler().fit(np.arange(20.0).reshape(-1, 1))
+    }
+    files = {}
+    for name, obj in objects.items():
+        files[name] = str(tmp_path / name)
+        with open(files[name], 'wb') as file:
+            pickle.dump(obj, file)
+    return files
+
+
+@pytest.fixture
+def same_second(monkeypatch):
+    monkeypatch.setattr(model_bundle.datetime, 'datetime', FixedDatetime)
+
+
+def test_same_model_in_the_same_second_gets_a_new_version(tmp_path, source_files, same_second):
+    deployment_dir = str(tmp_path / 'deployments')
+
+    first = publish_bundle(deployment_dir, source_files, 'Dummy', keep_versions=0)
+    second = publish_bundle(deployment_dir, source_files, 'Dummy', keep_versions=0)
+
+    assert os.path.basename(second) == os.path.basename(first) + '-2'
+    assert os.path.realpath(os.path.join(deployment_dir, 'current')) == os.path.realpath(second)
+    assert ModelBundle.load(first).version == os.path.basename(first)
+    assert ModelBundle.load(second).version == os.path.basename(second)
+
+
+def test_concurrent_publishes_all_land(tmp_path, source_files, same_second):
+    deployment_dir = str(tmp_path / 'deployments')
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        version_dirs = list(executor.map(lambda _: publish_bundle(deployment_dir, source_files, 'Dummy', keep_versions=0),
+                                         range(8)))
+
+    assert len(set(version_dirs)) == 8
+    for version_dir in version_dirs:
+        assert ModelBundle.load(version_dir).version == os.path.basename(version_dir)
+    versions_dir = os.path.join(deployment_dir, 'versions')
+    assert sorted(os.listdir(versions_dir)) == sorted(os.path.basename(path) for path in version_dirs)
+    assert sorted(os.listdir(deployment_dir)) == ['current', 'versions']
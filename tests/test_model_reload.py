@@ -0,0 +1,97 @@
+import os
+import time
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from sklearn.dummy import DummyRegressor
+from sklearn.preprocessing import StandardScaler
+
+import fastapp
+from modules.read_config import read_config
+from prediction_app.feature_mapping import keys_list, continuous_cols
+from prediction_app.model_bundle import ModelBundle, publish_model
+from prediction_app.predictor_registry import PredictorRegistry
+
+
+@pytest.fixture
+def model_files(tmp_path):
+    X = pd.DataFrame(np.random.default_rng(0).random((20, len(keys_list))), columns=keys_list)
+    scaler_dir = tmp_path / 'scaler'
+    scaler_dir.mkdir()
+    with open(scaler_dir / 'X_scaler.pkl', 'wb') as file:
+        pickle.dump(StandardScaler().fit(X[continuous_cols]), file)
+    with open(scaler_dir / 'y_scaler.pkl', 'wb') as file:
+        pickle.dump(StandardScaler().fit(np.arange(20.0).reshape(-1, 1)), file)
+    return DummyRegressor().fit(X, np.zeros(20)), str(scaler_dir)
+
+
+@pytest.fixture
+def registry(tmp_path, model_files, monkeypatch):
+    config = read_config('parameters.yaml')
+    app_config = config['prediction_app']
+    app_config.update(deployments=str(tmp_path / 'deployments'), scaler=model_files[1],
+                      bundle_poll_interval=0.05, load_retry_interval=0.05)
+    app_config['validation']['mode'] = 'off'
+    for feature in ('admission', 'prediction_log', 'prediction_cache', 'micro_batching', 'process_pool', 'shadow'):
+        app_config[feature]['enabled'] = False
+
+    registry = PredictorRegistry()
+    registry.config = config
+    monkeypatch.setattr(fastapp, 'registry', registry)
+    monkeypatch.setattr(fastapp, 'warmed_up', False)
+    monkeypatch.setattr(fastapp, 'load_error', None)
+    return registry
+
+
+def wait_until_ready(client, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = client.get('/ready')
+        if response.status_code == 200:
+            return response.json()
+        time.sleep(0.02)
+    raise AssertionError(f"Not ready after {timeout}s: {response.json()}")
+
+
+def test_bundle_published_after_startup_is_warmed_and_served(registry, model_files, monkeypatch):
+    registry.config['prediction_app']['model_source'] = 'bundle'
+    warmed = []
+    perform_prediction = fastapp.perform_prediction
+
+    def recorded_prediction(records, *args, **kwargs):
+        warmed.append(records)
+        return perform_prediction(records, *args, **kwargs)
+
+    monkeypatch.setattr(fastapp, 'perform_prediction', recorded_prediction)
+
+    with TestClient(fastapp.app) as client:
+        assert client.get('/ready').status_code == 503
+
+        version_dir = publish_model(registry.config['prediction_app']['deployments'], model_files[0],
+                                    model_files[1], 'DummyRegressor')
+
+        assert wait_until_ready(client)["model_version"] == os.path.basename(version_dir)
+        assert warmed, "the bundle was served without being warmed up"
+        response = client.post('/batch_predict', json=[fastapp.WARMUP_RECORD])
+        assert response.status_code == 200
+
+
+def test_registry_failure_at_startup_is_retried(registry, model_files, monkeypatch):
+    registry.config['prediction_app']['model_source'] = 'registry'
+    attempts = []
+
+    def flaky_registry(stage=None):
+        attempts.append(stage)
+        if len(attempts) < 3:
+            raise ConnectionError("registry unavailable")
+        X_scaler, y_scaler = (registry._load_scaler(name) for name in ('X_scaler.pkl', 'y_scaler.pkl'))
+        return ModelBundle(model=model_files[0], X_scaler=X_scaler, y_scaler=y_scaler, version='models:/test/1')
+
+    monkeypatch.setattr(registry, '_load_registry_model', flaky_registry)
+
+    with TestClient(fastapp.app) as client:
+        assert wait_until_ready(client)["model_version"] == 'models:/test/1'
+        assert len(attempts) == 3
+        assert client.post('/batch_predict', json=[fastapp.WARMUP_RECORD]).status_code == 200
@@ -0,0 +1,54 @@
+import json
+import asyncio
+import numpy as np
+import pytest
+
+import fastapp
+
+
+def fake_prediction(records, use_cache=False, validate=False):
+    # Echo each trip's miles, so results can be matched to their input lines
+    return np.array([[record['trip_miles']] for record in records], dtype=np.float64)
+
+
+@pytest.fixture(autouse=True)
+def scoring(monkeypatch):
+    monkeypatch.setattr(fastapp, 'perform_prediction', fake_prediction)
+
+
+def trip_line(miles):
+    return json.dumps({**fastapp.WARMUP_RECORD, "trip_miles": miles}).encode()
+
+
+def stream(body, chunk_size=10, max_line_bytes=1 << 16):
+    async def body_stream():
+        # Split mid-line to exercise lines spanning body chunks
+        for start in range(0, len(body), 7):
+            yield body[start:start + 7]
+
+    async def collect():
+        return b''.join([chunk async for chunk in fastapp.stream_predictions(body_stream(), chunk_size, max_line_bytes)])
+    return [json.loads(line) for line in asyncio.run(collect()).splitlines()]
+
+
+@pytest.mark.parametrize("bad_line", [
+    trip_line(2.0)[:-5],
+    trip_line(2.0) + b',' + trip_line(3.0),
+    b'{"trip_miles": "far"}',
+], ids=['truncated', 'two objects', 'wrong type'])
+def test_bad_line_between_good_lines(bad_line):
+    results = stream(b'\n'.join([trip_line(1.0), bad_line, trip_line(4.0)]) + b'\n')
+
+    assert len(results) == 3
+    assert results[0] == {"prediction": 1.0}
+    assert results[1]["record"] == 1 and results[1]["error"]
+    assert results[2] == {"prediction": 4.0}
+
+
+def test_bad_line_in_later_chunk_keeps_record_numbers():
+    lines = [trip_line(float(i)) for i in range(5)]
+    lines[3] = b'{'
+    results = stream(b'\n'.join(lines), chunk_size=2)
+
+    assert [result.get("prediction") for result in results] == [0.0, 1.0, 2.0, None, 4.0]
+    assert results[3]["record"] == 3
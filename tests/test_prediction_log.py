@@ -0,0 +1,52 @@
+import os
+import numpy as np
+import pyarrow.parquet as pq
+
+from modules.data_loader import read_data
+from prediction_app.prediction_log import PredictionLogSink
+
+FEATURE_TYPES = {"trip_miles": float, "request_datetime_hour": int, "request_datetime_day": str}
+
+
+def log_batches(directory, batches):
+    sink = PredictionLogSink(str(directory), FEATURE_TYPES)
+    for miles in batches:
+        records = [{"trip_miles": value, "request_datetime_hour": 1, "request_datetime_day": "Monday"}
+                   for value in miles]
+        sink.log(records, np.array([[value * 2] for value in miles]), 'v1', 0.001)
+    sink.close()
+
+
+def test_read_data_reads_every_part_file(tmp_path):
+    log_batches(tmp_path, [[1.0, 2.0], [3.0]])
+    hour_dir = tmp_path / os.listdir(tmp_path)[0]
+    # A second worker's file for the same hour, and one still being written
+    (part_file,) = os.listdir(hour_dir)
+    pq.write_table(pq.read_table(hour_dir / part_file), hour_dir / 'part-2-0.parquet')
+    (hour_dir / '.part-3-0.parquet.inprogress').write_bytes(b'PAR1')
+
+    df, name = read_data(str(tmp_path))
+
+    assert name == tmp_path.name
+    assert sorted(df['trip_miles']) == [1.0, 1.0, 2.0, 2.0, 3.0, 3.0]
+    assert set(df['date_hour'].astype(str)) == {hour_dir.name.split('=')[1]}
+
+    df, name = read_data(str(hour_dir))
+
+    assert name == hour_dir.name
+    assert len(df) == 6
+    assert (df['prediction'] == df['trip_miles'] * 2).all()
+
+
+def test_read_data_flat_directory_reads_first_file(tmp_path):
+    log_batches(tmp_path / 'log', [[1.0]])
+    hour_dir = tmp_path / 'log' / os.listdir(tmp_path / 'log')[0]
+    (part_file,) = os.listdir(hour_dir)
+    flat_dir = tmp_path / 'flat'
+    flat_dir.mkdir()
+    pq.write_table(pq.read_table(hour_dir / part_file), flat_dir / 'data.parquet')
+
+    df, name = read_data(str(flat_dir))
+
+    assert name == 'data.parquet'
+    assert len(df) == 1